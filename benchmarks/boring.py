@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# boring.py
+
+"""Benchmark finding boring columns in a wide ``.csv`` file with
+`csvsee.utils.boring_columns`, versus checking every boring column in every
+row (as `boring_columns` used to).
+
+Usage::
+
+    python benchmarks/boring.py [rows] [columns]
+
+A synthetic Performance Monitor-style file with ``rows`` rows (default 20000)
+and ``columns`` columns (default 2000) is generated in a temporary directory.
+Half the columns are constant, with a blank value now and then; the rest
+change from row to row.
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+
+from csvsee import utils
+
+
+def write_csvfile(filename, rows, columns):
+    """Write a synthetic ``.csv`` file with the given number of rows and
+    columns, half of them boring.
+    """
+    writer = csv.writer(open(filename, 'wb'))
+    writer.writerow(['\\\\HOST\\Counter %d' % col for col in range(columns)])
+    for row in range(rows):
+        values = [str(col) if col % 2 else '%.6f' % random.uniform(0, 100)
+                  for col in range(columns)]
+        # Perfmon writes a blank value now and then
+        if row % 100 == 0:
+            values[row % columns] = ' '
+        writer.writerow(values)
+
+
+def boring_columns_all(csvfile):
+    """Find boring columns the way `boring_columns` used to, checking each
+    boring column in every row of the file.
+    """
+    reader = csv.reader(open(csvfile))
+    fieldnames = reader.next()
+    rows = utils.projected_rows(reader, fieldnames, fieldnames)
+    boring = range(len(fieldnames))
+    prev = list(next(rows, [''] * len(fieldnames)))
+    for row in rows:
+        for col in list(boring):
+            if not prev[col].strip():
+                prev[col] = row[col]
+            elif row[col].strip() and row[col] != prev[col]:
+                boring.remove(col)
+    return [fieldnames[col] for col in boring]
+
+
+def main(rows, columns):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    filename = os.path.join(temp_dir, 'perfmon.csv')
+    write_csvfile(filename, rows, columns)
+
+    results = []
+    for func in (boring_columns_all, utils.boring_columns):
+        start = time.time()
+        boring = func(filename)
+        elapsed = time.time() - start
+        results.append((boring, elapsed))
+        print("%-20s %8.2f s  %10d rows/s" %
+              (func.__name__, elapsed, rows / elapsed))
+
+    # Both must find the same columns
+    (old_boring, old_time), (new_boring, new_time) = results
+    assert new_boring == old_boring
+    print("%d boring columns" % len(new_boring))
+    print("Speedup: %.1fx" % (old_time / new_time))
+
+    start = time.time()
+    utils.boring_columns(filename, sample=500)
+    print("Sampling 500 rows: %.2f s" % (time.time() - start))
+    os.unlink(filename)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    main(rows, columns)
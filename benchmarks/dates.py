@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# dates.py
+
+"""Benchmark date/time format guessing and parsing in `csvsee.dates`.
+
+Usage::
+
+    python benchmarks/dates.py [lines]
+
+Compares, in lines per second:
+
+* Guessing the format of ``lines`` lines (default 500) having no timestamp,
+  building the format regexps for every line (as `guess_format` used to)
+  versus `guess_format` with the format regexps built once
+* Parsing timestamps with `datetime.strptime` versus `dates.parse_function`
+"""
+
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+from csvsee import dates
+
+FORMATS = [
+    '%Y/%m/%d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S.%f',
+    '%m/%d/%y %I:%M:%S %p',
+]
+
+
+def guess_uncached(line):
+    """Guess the format of ``line`` the way `guess_format` used to, compiling
+    all format regexps each time.
+    """
+    format_regexps = dates._compile_format_regexps(
+        dates._date_formats, dates._time_formats)
+    for format, regexp in format_regexps:
+        if regexp.search(line):
+            return format
+    raise dates.CannotParse(line)
+
+
+def guess_lines(guess, lines):
+    for line in lines:
+        try:
+            guess(line)
+        except dates.CannotParse:
+            pass
+
+
+def parse_lines(parse, lines):
+    for line in lines:
+        parse(line)
+
+
+def compare(title, old, new, lines):
+    """Time ``old(lines)`` and ``new(lines)`` and print the results.
+    """
+    print(title)
+    times = []
+    for name, func in (('before', old), ('after', new)):
+        start = time.time()
+        func(lines)
+        elapsed = time.time() - start
+        times.append(elapsed)
+        print("  %-8s %12d lines/s" % (name, len(lines) / elapsed))
+    print("  Speedup: %.1fx" % (times[0] / times[1]))
+
+
+def main(lines):
+    # Log lines without any timestamp, with and without digits
+    no_dates = [random.choice(['Starting worker thread %d of 64' % n,
+                               'INFO: connection pool is full'])
+                for n in range(lines)]
+    compare("Guessing lines with no timestamp",
+            lambda lines: guess_lines(guess_uncached, lines),
+            lambda lines: guess_lines(dates.guess_format, lines),
+            no_dates)
+
+    start = datetime(2010, 8, 30, 13, 0, 0)
+    for format in FORMATS:
+        stamps = [(start + timedelta(seconds=7.25 * n)).strftime(format)
+                  for n in range(lines * 100)]
+        strptime = lambda lines: parse_lines(
+            lambda line: datetime.strptime(line, format), lines)
+        parse_function = lambda lines: parse_lines(
+            dates.parse_function(format), lines)
+        compare("Parsing '%s'" % format, strptime, parse_function, stamps)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# graph_batch.py
+
+"""Benchmark saving several graphs of one ``.csv`` file, generating each
+`Graph` by itself versus all of them at once with `graph.save_graphs`.
+
+Usage::
+
+    python benchmarks/graph_batch.py [rows] [columns] [graphs]
+
+A synthetic Performance Monitor-style file with ``rows`` rows (default
+20000) and ``columns`` columns (default 200) is generated in a temporary
+directory, and ``graphs`` graphs (default 12) of different columns are
+saved as ``.png`` files. Each graph plots at most 1000 points per column, so
+that drawing doesn't take much longer than reading the file.
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+
+from csvsee import graph
+
+
+def write_csvfile(filename, rows, columns):
+    """Write a synthetic ``.csv`` file of one-second samples.
+    """
+    writer = csv.writer(open(filename, 'wb'))
+    writer.writerow(['Time'] + ['Counter %d' % col for col in range(columns)])
+    start = datetime(2010, 8, 30, 13, 0, 0)
+    for row in range(rows):
+        writer.writerow(
+            [(start + timedelta(seconds=row)).strftime('%Y/%m/%d %H:%M:%S')] +
+            ['%.3f' % random.uniform(0, 100) for col in range(columns)])
+
+
+def make_graphs(filename, temp_dir, count):
+    """Return a list of ``(graph, filename)`` for ``count`` graphs, each of
+    a few columns, and the last of the top 5 columns by peak.
+    """
+    graphs = []
+    for index in range(count - 1):
+        g = graph.Graph(filename, y=['Counter %d[0-9]$' % (index + 1)],
+                        maxpoints=1000)
+        graphs.append((g, os.path.join(temp_dir, 'graph%d.png' % index)))
+    g = graph.Graph(filename, peak=5, maxpoints=1000)
+    graphs.append((g, os.path.join(temp_dir, 'peak.png')))
+    return graphs
+
+
+def save_each(graphs):
+    for g, filename in graphs:
+        g.generate()
+        g.save(filename)
+        g.close()
+
+
+def main(rows, columns, count):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    filename = os.path.join(temp_dir, 'perfmon.csv')
+    write_csvfile(filename, rows, columns)
+
+    # Keep the output quiet
+    stdout = sys.stdout
+    times = []
+    for name, save in (('before', save_each), ('after', graph.save_graphs)):
+        graphs = make_graphs(filename, temp_dir, count)
+        start = time.time()
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            save(graphs)
+        finally:
+            sys.stdout = stdout
+        elapsed = time.time() - start
+        times.append(elapsed)
+        print("  %-8s %8.2f s  for %d graphs" % (name, elapsed, count))
+        for g, png_file in graphs:
+            os.unlink(png_file)
+    print("  Speedup: %.1fx" % (times[0] / times[1]))
+
+    os.unlink(filename)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+    main(rows, columns, count)
@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+# graph_points.py
+
+"""Benchmark drawing a graph of a long ``.csv`` file with `csvsee.graph`,
+plotting every point versus plotting at most ``maxpoints`` for each column.
+
+Usage::
+
+    python benchmarks/graph_points.py [rows] [maxpoints]
+
+A synthetic file with ``rows`` rows (default 200000) of one-second samples
+in 4 columns is generated in a temporary directory, and graphed to ``.svg``
+with and without ``maxpoints`` (default 2000). Prints the time taken and the
+size of each ``.svg`` file.
+"""
+
+import os
+import sys
+import csv
+import time
+import math
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+
+from csvsee.graph import Graph
+
+
+def write_csvfile(filename, rows):
+    """Write a synthetic ``.csv`` file of one-second samples, with a few
+    short spikes in each column.
+    """
+    writer = csv.writer(open(filename, 'wb'))
+    writer.writerow(['Time'] + ['Counter %d' % col for col in range(4)])
+    start = datetime(2010, 8, 30, 13, 0, 0)
+    for row in range(rows):
+        values = [50 + 40 * math.sin(row / 3000.0 + col) + random.gauss(0, 5)
+                  for col in range(4)]
+        if random.random() < 0.0001:
+            values[random.randrange(4)] = 500
+        writer.writerow([(start + timedelta(seconds=row)).strftime(
+            '%Y/%m/%d %H:%M:%S')] + ['%.3f' % value for value in values])
+
+
+def main(rows, maxpoints):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    filename = os.path.join(temp_dir, 'perfmon.csv')
+    svg_file = os.path.join(temp_dir, 'perfmon.svg')
+    write_csvfile(filename, rows)
+
+    times = []
+    for name, points in (('before', 0), ('after', maxpoints)):
+        start = time.time()
+        graph = Graph(filename, maxpoints=points)
+        graph.generate()
+        graph.save(svg_file)
+        elapsed = time.time() - start
+        times.append(elapsed)
+        print("  %-8s %8.2f s  %8d KB .svg" %
+              (name, elapsed, os.path.getsize(svg_file) / 1024))
+        os.unlink(svg_file)
+    print("  Speedup: %.1fx" % (times[0] / times[1]))
+
+    os.unlink(filename)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    maxpoints = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    main(rows, maxpoints)
@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# grep.py
+
+"""Benchmark counting matches in a log file for `csvsee.utils.grep_files`,
+reading one line at a time versus searching memory-mapped blocks.
+
+Usage::
+
+    python benchmarks/grep.py [lines]
+
+A synthetic log with ``lines`` lines (default 500000) is generated in a
+temporary directory, with a timestamp on most lines and a few stack traces,
+and searched for three plain-text matches using each method.
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from csvsee import utils, dates
+
+DATE_FORMAT = '%Y/%m/%d %H:%M:%S'
+MATCHES = ['ERROR', 'Timeout', 'Connection reset']
+
+
+def write_logfile(filename, lines):
+    """Write a synthetic log file with about ``lines`` lines.
+    """
+    outfile = open(filename, 'w')
+    start = datetime(2010, 8, 30, 13, 0, 0)
+    messages = ['INFO Request handled in %d ms', 'DEBUG Cache hit for key %d',
+                'WARN Slow query took %d ms', 'ERROR Timeout after %d ms']
+    for line in range(lines):
+        timestamp = (start + timedelta(seconds=line // 20)).strftime(DATE_FORMAT)
+        message = random.choice(messages) % random.randint(1, 5000)
+        outfile.write('%s %s\n' % (timestamp, message))
+        if line % 1000 == 0:
+            outfile.write('java.net.SocketException: Connection reset\n')
+            outfile.write('    at java.net.SocketInputStream.read\n')
+    outfile.close()
+
+
+def count_lines(filename):
+    rows = utils._Counts(utils._match_columns(MATCHES))
+    utils._count_matches(
+        open(filename), dates.DateChopper(DATE_FORMAT, 60),
+        utils.MultiMatch(MATCHES), rows, datetime(1970, 1, 1))
+    return rows
+
+
+def count_blocks(filename):
+    rows = utils._Counts(utils._match_columns(MATCHES))
+    blocks = utils._mapped_blocks(filename, 0, os.path.getsize(filename))
+    utils._scan_blocks(
+        blocks, dates.DateChopper(DATE_FORMAT, 60),
+        dates.timestamp_regexp(DATE_FORMAT), MATCHES, rows,
+        datetime(1970, 1, 1))
+    return rows
+
+
+def main(lines):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    filename = os.path.join(temp_dir, 'app.log')
+    write_logfile(filename, lines)
+    megabytes = os.path.getsize(filename) / 1048576.0
+
+    results = []
+    for func in (count_lines, count_blocks):
+        start = time.time()
+        result = func(filename)
+        elapsed = time.time() - start
+        results.append((result, elapsed))
+        print("%-14s %8.2f s  %8.1f MB/s" %
+              (func.__name__, elapsed, megabytes / elapsed))
+
+    # Both methods must give the same counts
+    (old_result, old_time), (new_result, new_time) = results
+    assert new_result == old_result
+    print("Speedup: %.1fx" % (old_time / new_time))
+    os.unlink(filename)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000)
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# grinder_parse.py
+
+"""Benchmark reading Grinder ``data*`` files with `csv.DictReader` versus
+the `csvsee.grinder.data_batches` parser.
+
+Usage::
+
+    python benchmarks/grinder_parse.py [rows]
+
+A synthetic data file with ``rows`` rows (default 200000) is generated in a
+temporary directory, and read using each method.
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+
+from csvsee import grinder
+
+HEADER = ('Thread, Run, Test, Start time (ms since Epoch), Test time, Errors, '
+          'HTTP response code, HTTP response length, HTTP response errors, '
+          'Time to resolve host, Time to establish connection, '
+          'Time to first byte')
+
+
+def write_datafile(filename, rows, tests=50):
+    """Write a synthetic Grinder data file with the given number of rows.
+    """
+    outfile = open(filename, 'w')
+    outfile.write(HEADER + '\n')
+    start = 1283195430000
+    for row in range(rows):
+        outfile.write('%d, %d, %d, %d, %d, 0, %d, %d, 0, 0, %d, %d\n' % (
+            row % 20, row // 20, 1000 + row % tests, start + row * 10,
+            random.randint(10, 5000), random.choice([200, 200, 200, 503]),
+            random.randint(100, 20000), random.randint(0, 50),
+            random.randint(10, 500)))
+    outfile.close()
+
+
+def write_outfile(filename, tests=50):
+    """Write a Grinder out file summarizing the given number of tests.
+    """
+    outfile = open(filename, 'w')
+    for number in range(1000, 1000 + tests):
+        outfile.write('Test %d 0 0 0 0 0 "Test %d"\n' % (number, number))
+    outfile.close()
+
+
+def dictreader(outfile, datafile):
+    report = grinder.Report(1, outfile)
+    for row in csv.DictReader(open(datafile, 'r'), skipinitialspace=True):
+        report.add(row)
+    return report
+
+
+def data_batches(outfile, datafile):
+    return grinder.Report(1, outfile, datafile)
+
+
+def main(rows):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    outfile = os.path.join(temp_dir, 'out_0.log')
+    datafile = os.path.join(temp_dir, 'data_0.log')
+    write_outfile(outfile)
+    write_datafile(datafile, rows)
+    results = []
+    for func in (dictreader, data_batches):
+        start = time.time()
+        report = func(outfile, datafile)
+        elapsed = time.time() - start
+        results.append((report, elapsed))
+        print("%-12s %8.2f s  %10d rows/s" % (func.__name__, elapsed, rows / elapsed))
+
+    # Both methods must give the same statistics
+    (old, old_time), (new, new_time) = results
+    for number, test in old.tests.items():
+        assert test.counts == new.tests[number].counts
+        assert test.sums == new.tests[number].sums
+    print("Speedup: %.1fx" % (old_time / new_time))
+    os.unlink(outfile)
+    os.unlink(datafile)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# read_xy.py
+
+"""Benchmark reading X and Y values from a wide ``.csv`` file with
+`csvsee.utils.read_xy_values` versus `csvsee.utils.read_xy_arrays`.
+
+Usage::
+
+    python benchmarks/read_xy.py [rows] [columns]
+
+A synthetic Performance Monitor-style file with ``rows`` rows (default 20000)
+and ``columns`` columns (default 500) is generated in a temporary directory,
+and a timestamp plus 20 of its columns are read using each method.
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from csvsee import utils
+
+DATE_FORMAT = '%m/%d/%Y %H:%M:%S.%f'
+
+
+def write_csvfile(filename, rows, columns):
+    """Write a synthetic ``.csv`` file with a timestamp column and the given
+    number of rows and numeric columns.
+    """
+    writer = csv.writer(open(filename, 'wb'))
+    writer.writerow(['(PDH-CSV 4.0) (Eastern Daylight Time)(240)'] +
+                    ['\\\\HOST\\Counter %d' % col for col in range(columns)])
+    start = datetime(2010, 8, 30, 13, 0, 0)
+    for row in range(rows):
+        timestamp = start + timedelta(seconds=15 * row)
+        values = ['%.6f' % random.uniform(0, 100) for col in range(columns)]
+        # Perfmon writes a blank value now and then
+        if row % 100 == 0:
+            values[row % columns] = ' '
+        writer.writerow([timestamp.strftime(DATE_FORMAT)[:-3]] + values)
+
+
+def read_xy_values(filename, x_column, y_columns):
+    reader = csv.DictReader(open(filename))
+    return utils.read_xy_values(reader, x_column, y_columns, DATE_FORMAT)
+
+
+def read_xy_arrays(filename, x_column, y_columns):
+    reader = csv.DictReader(open(filename))
+    return utils.read_xy_arrays(reader, x_column, y_columns, DATE_FORMAT)
+
+
+def main(rows, columns):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    filename = os.path.join(temp_dir, 'perfmon.csv')
+    write_csvfile(filename, rows, columns)
+    fieldnames = utils.column_names(filename)
+    x_column = fieldnames[0]
+    y_columns = fieldnames[1::columns // 20][:20]
+
+    results = []
+    for func in (read_xy_values, read_xy_arrays):
+        start = time.time()
+        x_values, y_values = func(filename, x_column, y_columns)
+        elapsed = time.time() - start
+        results.append(((x_values, y_values), elapsed))
+        print("%-16s %8.2f s  %10d rows/s" % (func.__name__, elapsed, rows / elapsed))
+
+    # Both methods must give the same values
+    ((old_x, old_y), old_time), ((new_x, new_y), new_time) = results
+    assert new_x.astype(object).tolist() == old_x
+    for y_col in y_columns:
+        assert new_y[y_col].tolist() == old_y[y_col]
+    print("Speedup: %.1fx" % (old_time / new_time))
+    os.unlink(filename)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    main(rows, columns)
@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+# render.py
+
+"""Benchmark saving a graph of each ``.csv`` file in a directory with
+`csvsee.graph.render_graphs`, one at a time versus in a pool of processes.
+
+Usage::
+
+    python benchmarks/render.py [files] [jobs] [rows]
+
+``files`` synthetic ``.csv`` files (default 8) of ``rows`` rows (default
+20000) in 4 columns are generated in a temporary directory, and graphed with
+``jobs`` processes (default, the number of CPUs). The speedup can't be more
+than the number of CPUs.
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+from csvsee import graph
+from graph_points import write_csvfile
+
+
+def main(files, jobs, rows):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    write_csvfile(os.path.join(temp_dir, 'report_0.csv'), rows)
+    for index in range(1, files):
+        shutil.copy(os.path.join(temp_dir, 'report_0.csv'),
+                    os.path.join(temp_dir, 'report_%d.csv' % index))
+    csv_files = graph.find_csv_files(temp_dir)
+
+    times = []
+    for name, pool_size in (('before', 1), ('after', jobs)):
+        start = time.time()
+        for csv_file, filenames, seconds, error in graph.render_graphs(
+                csv_files, {'maxpoints': 2000}, jobs=pool_size):
+            assert error is None, error
+        elapsed = time.time() - start
+        times.append(elapsed)
+        print("  %-8s %8.2f s  for %d files with %d jobs" %
+              (name, elapsed, files, pool_size))
+        for png_file in glob.glob(os.path.join(temp_dir, '*.png')):
+            os.unlink(png_file)
+    print("  Speedup: %.1fx" % (times[0] / times[1]))
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    main(files, jobs, rows)
@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# startup.py
+
+"""Benchmark how long ``csvs`` takes to start and run a quick command,
+with pylab imported up front (as ``csvs`` used to, through
+`csvsee.graph`) versus imported only when a graph is drawn.
+
+Usage::
+
+    python benchmarks/startup.py [runs]
+
+Runs ``csvs info`` on a small ``.csv`` file ``runs`` times (default 20) in
+new Python processes, and prints the average time for each run.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+csvs = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'csvs')
+
+# Run csvs with the given arguments, importing pylab first, then say whether
+# matplotlib was imported
+run_csvs = """
+import sys, runpy
+if %r:
+    import pylab
+sys.argv = %r
+runpy.run_path(sys.argv[0], run_name='__main__')
+sys.stderr.write(str('matplotlib' in sys.modules))
+"""
+
+
+def time_runs(args, runs, eager):
+    """Run ``csvs`` with ``args`` in ``runs`` new processes, importing pylab
+    first if ``eager`` is true. Return the average time for each, and
+    whether matplotlib was imported.
+    """
+    code = run_csvs % (eager, [csvs] + args)
+    devnull = open(os.devnull, 'w')
+    start = time.time()
+    for run in range(runs):
+        process = subprocess.Popen([sys.executable, '-c', code],
+                                   stdout=devnull, stderr=subprocess.PIPE)
+        imported = process.communicate()[1].strip().endswith('True')
+    devnull.close()
+    return (time.time() - start) / runs, imported
+
+
+def main(runs):
+    csvfile = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+    csvfile.write('Time,CPU,Memory\n1,5,100\n2,7,200\n')
+    csvfile.close()
+
+    times = []
+    for name, eager in (('before', True), ('after', False)):
+        elapsed, imported = time_runs(['info', csvfile.name], runs, eager)
+        times.append(elapsed)
+        print("  %-8s %8.1f ms  (matplotlib imported: %s)" %
+              (name, elapsed * 1000, imported))
+    os.unlink(csvfile.name)
+
+    # csvs info must not need matplotlib
+    assert not imported
+    print("  Speedup: %.1fx" % (times[0] / times[1]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
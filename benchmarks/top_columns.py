@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# top_columns.py
+
+"""Benchmark finding and reading the top columns of a wide ``.csv`` file,
+by reading every column in full and ranking them with
+`utils.top_by_average` (as `Graph.generate` used to for ``-top``), versus
+ranking them with `utils.column_averages_and_peaks` first and reading only
+the top columns.
+
+Usage::
+
+    python benchmarks/top_columns.py [rows] [columns] [top]
+
+A synthetic Performance Monitor-style file with ``rows`` rows (default
+5000) and ``columns`` columns (default 2000) is generated in a temporary
+directory. Each way is run in a new process, and its time and peak memory
+use are printed.
+"""
+
+import os
+import sys
+import csv
+import time
+import resource
+import tempfile
+import multiprocessing
+
+from csvsee import utils
+from boring import write_csvfile
+
+
+def read_all(filename, top):
+    """Read every column, and keep the ``top`` columns by average.
+    """
+    reader = csv.DictReader(open(filename))
+    x_column, y_columns = reader.fieldnames[0], reader.fieldnames[1:]
+    x_values, y_values = utils.read_xy_arrays(reader, x_column, y_columns)
+    top_columns = utils.top_by_average(top, y_columns, y_values)
+    return top_columns, [y_values[column] for column in top_columns]
+
+
+def read_top(filename, top):
+    """Rank the columns by average, and read only the ``top`` columns.
+    """
+    reader = csv.reader(open(filename))
+    fieldnames = reader.next()
+    x_column, y_columns = fieldnames[0], fieldnames[1:]
+    averages, peaks = utils.column_averages_and_peaks(
+        reader, fieldnames, y_columns)
+    top_columns = utils.top_by_score(top, y_columns, averages)
+    reader = csv.DictReader(open(filename))
+    x_values, y_values = utils.read_xy_arrays(reader, x_column, top_columns)
+    return top_columns, [y_values[column] for column in top_columns]
+
+
+def measure(args):
+    """Run ``func(filename, top)``, and return its top columns, the time
+    taken, and the peak memory use of this process in megabytes.
+    """
+    func, filename, top = args
+    start = time.time()
+    top_columns, values = func(filename, top)
+    elapsed = time.time() - start
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return top_columns, elapsed, memory
+
+
+def main(rows, columns, top):
+    temp_dir = tempfile.mkdtemp(prefix='csvsee_bench')
+    filename = os.path.join(temp_dir, 'perfmon.csv')
+    write_csvfile(filename, rows, columns)
+
+    results = []
+    for name, func in (('before', read_all), ('after', read_top)):
+        # A new process for each, so peak memory use is measured separately
+        pool = multiprocessing.Pool(1)
+        top_columns, elapsed, memory = pool.apply(measure,
+                                                  [(func, filename, top)])
+        pool.close()
+        pool.join()
+        results.append((top_columns, elapsed, memory))
+        print("  %-8s %8.2f s  %8.1f MB peak" % (name, elapsed, memory))
+
+    # Both must find the same columns
+    assert results[0][0] == results[1][0]
+    print("  Speedup: %.1fx, memory: %.1fx less" %
+          (results[0][1] / results[1][1], results[0][2] / results[1][2]))
+    os.unlink(filename)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    top = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    main(rows, columns, top)
@@ -0,0 +1,216 @@
+# compressed.py
+
+"""Reading compressed files as if they weren't.
+
+Use `open_file` in place of ``open`` to read plain, gzip (``.gz``), bzip2
+(``.bz2``) or xz (``.xz``) files alike::
+
+    from csvsee.compressed import open_file
+    for line in open_file('app.log.gz'):
+        print(line)
+
+Reading ``.xz`` files needs the ``lzma`` module, which is included with
+Python 3.3 and later, and available for older versions as
+``backports.lzma``.
+"""
+
+import os
+import bz2
+import zlib
+from cStringIO import StringIO
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+def _gzip_decompressor():
+    """Return a decompressor for gzip data, including its header.
+    """
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _xz_decompressor():
+    """Return a decompressor for xz data, or raise `IOError` if the ``lzma``
+    module isn't available.
+    """
+    if lzma is None:
+        raise IOError("Reading .xz files requires the lzma module")
+    return lzma.LZMADecompressor()
+
+
+# Function returning a new streaming decompressor for each file extension
+_decompressors = {
+    '.gz': _gzip_decompressor,
+    '.bz2': bz2.BZ2Decompressor,
+    '.xz': _xz_decompressor,
+}
+
+# Extensions of all compressed files that can be read
+extensions = sorted(_decompressors.keys())
+
+
+def is_compressed(filename):
+    """Return ``True`` if ``filename`` has the extension of a compressed file
+    that `open_file` can read.
+
+        >>> is_compressed('data_0.log.gz')
+        True
+        >>> is_compressed('data_0.log')
+        False
+
+    """
+    return os.path.splitext(filename)[1].lower() in _decompressors
+
+
+def open_file(filename, mode='r'):
+    """Open ``filename`` for reading with the given ``mode``. Compressed
+    files (see `is_compressed`) are opened as a `DecompressedFile`; all
+    others are opened normally.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in _decompressors:
+        return DecompressedFile(filename, _decompressors[extension])
+    return open(filename, mode)
+
+
+class DecompressedFile:
+    """A read-only file object with the decompressed contents of a
+    compressed file. The file is decompressed as it's read, in large blocks,
+    without writing the decompressed data anywhere.
+
+    Files made of several compressed streams one after another (as from
+    ``cat a.gz b.gz > c.gz``) are read in full, as ``gzip -d`` would.
+    Iterating over lines is much faster than calling `readline` for each;
+    as with regular files, don't mix the two.
+    """
+    # Bytes of compressed data to read at a time
+    block_size = 1 << 20
+
+    def __init__(self, filename, decompressor):
+        """Open ``filename``, and decompress it with streaming decompressors
+        returned by the function ``decompressor``.
+        """
+        self.name = filename
+        self._new_decompressor = decompressor
+        self._decompressor = decompressor()
+        self._raw = open(filename, 'rb')
+        # Decompressed data, not returned yet from ``_offset`` on
+        self._buffer = ''
+        self._offset = 0
+        # Number of decompressed bytes returned so far
+        self._position = 0
+
+
+    def _fill(self):
+        """Decompress the next block of the file into the buffer. Return
+        ``False`` if there's nothing left to decompress.
+        """
+        while True:
+            data = self._raw.read(self.block_size)
+            if not data:
+                return False
+            try:
+                output = self._decompressor.decompress(data)
+            # Previous stream ended exactly at the end of the last block
+            except EOFError:
+                self._decompressor = self._new_decompressor()
+                output = self._decompressor.decompress(data)
+            # Start of another compressed stream, unless it's just padding
+            while self._decompressor.unused_data.strip('\0'):
+                data = self._decompressor.unused_data
+                self._decompressor = self._new_decompressor()
+                output += self._decompressor.decompress(data)
+            if output:
+                # Data already returned is only dropped here, where the
+                # buffer is copied anyway, rather than on every read
+                self._buffer = self._buffer[self._offset:] + output
+                self._offset = 0
+                return True
+
+
+    def read(self, size=-1):
+        """Read and return up to ``size`` decompressed bytes, or all the rest
+        of the file if ``size`` is negative.
+        """
+        if size < 0:
+            while self._fill():
+                pass
+            size = len(self._buffer) - self._offset
+        else:
+            while len(self._buffer) - self._offset < size and self._fill():
+                pass
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        self._position += len(data)
+        return data
+
+
+    def readline(self):
+        """Read and return the next line, including the newline.
+        """
+        end = self._buffer.find('\n', self._offset)
+        while end < 0 and self._fill():
+            end = self._buffer.find('\n', self._offset)
+        if end < 0:
+            end = len(self._buffer)
+        return self.read(end + 1 - self._offset)
+
+
+    def __iter__(self):
+        """Iterate over lines in the rest of the file.
+        """
+        while self._offset < len(self._buffer) or self._fill():
+            # Split all the complete lines in the buffer at once
+            end = self._buffer.rfind('\n', self._offset) + 1
+            while not end and self._fill():
+                end = self._buffer.rfind('\n', self._offset) + 1
+            # Last line, with no newline
+            if not end:
+                end = len(self._buffer)
+            lines = self._buffer[self._offset:end]
+            self._offset = end
+            for line in StringIO(lines):
+                self._position += len(line)
+                yield line
+
+
+    def tell(self):
+        """Return the number of decompressed bytes read so far.
+        """
+        return self._position
+
+
+    def tell_compressed(self):
+        """Return the number of compressed bytes read so far from the
+        underlying file, for showing progress.
+        """
+        return self._raw.tell()
+
+
+    def seek(self, offset, whence=0):
+        """Move to the decompressed byte ``offset``. Only seeking forward
+        from the current position is supported; otherwise, raise `IOError`.
+        """
+        if whence == 1:
+            offset += self._position
+        elif whence != 0:
+            raise IOError("Can't seek from the end of a compressed file")
+        if offset < self._position:
+            raise IOError("Can't seek backwards in a compressed file")
+        # Decompress and skip ahead
+        while offset > self._position:
+            if not self.read(min(offset - self._position, self.block_size)):
+                break
+
+
+    def close(self):
+        """Close the underlying file.
+        """
+        self._raw.close()
+        self._buffer = ''
+        self._offset = 0
@@ -3,16 +3,51 @@
 """Provides a `Graph` class for creating graphs from ``.csv`` data files.
 """
 
+import os
+import sys
 import csv
+import glob
+import json
+import time
+import multiprocessing
+from itertools import izip
+from distutils.version import LooseVersion
 
 from csvsee import utils, dates
-try:
-    import pylab
-    import matplotlib as mpl
-except ImportError:
-    print("Could not import pylab and/or matplotlib. Please install python-matplotlib.")
-    print("Continuing anyway, but you will not be able to use the graphing feature.")
-    # Continue anyway, so docs can be generated
+from csvsee.compressed import open_file
+
+# Set by `_import_pylab` when a graph is first drawn, since importing them
+# takes longer than anything else CSVSee does
+pylab = None
+mpl = None
+
+
+def _import_pylab(backend=None):
+    """Import ``pylab`` and ``matplotlib`` (as ``mpl``), if they haven't been
+    imported yet, and switch to the given matplotlib ``backend``, if any.
+    Raise `ImportError` if they aren't installed.
+    """
+    global pylab, mpl
+    if pylab is None:
+        try:
+            import matplotlib as mpl
+            if backend:
+                mpl.use(backend)
+            import matplotlib.dates
+            import pylab
+        except ImportError:
+            raise ImportError("Could not import pylab and/or matplotlib."
+                              " Please install python-matplotlib.")
+    elif backend and mpl.get_backend().lower() != backend.lower():
+        pylab.switch_backend(backend)
+
+
+def _plots_datetime64():
+    """Return ``True`` if the installed matplotlib can plot ``datetime64``
+    arrays, as version 2.2 and later can.
+    """
+    _import_pylab()
+    return LooseVersion(mpl.__version__) >= LooseVersion('2.2')
 
 
 class Graph (object):
@@ -33,6 +68,7 @@ class Graph (object):
         'top',
         'drop',
         'peak',
+        'maxpoints',
     ]
     floats = [
         'ymax',
@@ -62,6 +98,7 @@ class Graph (object):
             'linestyle': '',
             'dateformat': 'guess',
             'gmtoffset': 0,
+            'maxpoints': 0,
         }
         # Update default configuration with keyword args
         self.config.update(kwargs)
@@ -85,14 +122,41 @@ class Graph (object):
         self.config[name] = value
 
 
+    def set(self, name, value):
+        """Set the configuration setting ``name`` to ``value``, converted to
+        the setting's type. Raise `ValueError` if there's no such setting,
+        or ``value`` can't be converted.
+        """
+        if name in self.strings:
+            value = _utf8(value)
+        elif name in self.ints:
+            value = int(value)
+        elif name in self.floats:
+            value = float(value)
+        elif name in self.bools:
+            value = bool(value)
+        elif name == 'y':
+            if isinstance(value, basestring):
+                value = [value]
+            value = [_utf8(expr) for expr in value]
+        else:
+            raise ValueError("Unknown graph setting: '%s'" % name)
+        self.config[name] = value
+
+
     def guess_date_format(self, date_column):
         """Try to guess the date format used in the current ``.csv`` file, by
-        reading from the first row of the ``date_column`` column.
+        reading from the first row of the ``date_column`` column. Raise
+        `ValueError` if the file has no rows after the heading.
         """
-        infile = open(self.csv_file, 'r')
+        infile = open_file(self.csv_file, 'r')
         reader = csv.DictReader(infile)
-        row = reader.next()
+        # Don't let StopIteration escape, or it would quietly end
+        # _plot_graphs
+        row = next(reader, None)
         infile.close()
+        if row is None:
+            raise ValueError("No data rows in '%s'" % self.csv_file)
         # Return the guessed format
         return dates.guess_format(row[date_column])
 
@@ -100,23 +164,58 @@ class Graph (object):
     def generate(self):
         """Generate the graph.
         """
+        for graph in _plot_graphs([self]):
+            pass
 
-        print("Reading '%s'" % self.csv_file)
-        reader = csv.DictReader(open(self.csv_file, 'r'))
 
-        # Attempt to match column names
-        x_column, y_columns = utils.matching_xy_fields(
-            self['x'], self['y'], reader.fieldnames)
+    def top_columns(self, y_columns, averages, peaks):
+        """Return the top ``top`` of ``y_columns`` by average, or the top
+        ``peak`` by peak value, after skipping the first ``drop``. The
+        ``averages`` and ``peaks`` are dictionaries, as returned by
+        `utils.column_averages_and_peaks`.
+        """
+        # Get the top n by average?
+        if self['top']:
+            y_columns = utils.top_by_score(
+                self['top'], y_columns, averages, self['drop'])
+            print("********** Top %d columns by average:" % self['top'])
+        # Get the top n by peak?
+        elif self['peak']:
+            y_columns = utils.top_by_score(
+                self['peak'], y_columns, peaks, self['drop'])
+            print("********** Top %d columns by peak:" % self['peak'])
+        print('\n'.join(y_columns))
+        return y_columns
+
 
+    def read_values(self, reader, x_column, y_columns):
+        """Read ``(x_values, y_values)`` for the given columns from the
+        `csv.DictReader` ``reader``, as `utils.read_xy_values` does, using
+        the ``dateformat``, ``gmtoffset`` and ``zerotime`` settings. If
+        ``dateformat`` is ``'guess'``, it's set to the guessed format.
+        """
         # Do we need to guess what format the date is in?
         if self['dateformat'] == 'guess':
             self['dateformat'] = self.guess_date_format(x_column)
 
-        # Read each row in the .csv file and populate x and y value lists
-        x_values, y_values = utils.read_xy_values(
+        # Read each row in the .csv file and populate x and y values,
+        # using NumPy arrays if possible
+        if utils.import_numpy() is not None and \
+           (not self['dateformat'] or _plots_datetime64()):
+            read_xy = utils.read_xy_arrays
+        else:
+            read_xy = utils.read_xy_values
+        return read_xy(
             reader, x_column, y_columns,
             self['dateformat'], self['gmtoffset'], self['zerotime'])
 
+
+    def plot(self, x_column, y_columns, x_values, y_values):
+        """Draw the graph of ``y_columns`` from values already read with
+        `read_values`; ``y_values`` may have other columns too.
+        """
+        _import_pylab()
+
         # Create the figure and plot
         self.figure = pylab.figure()
         self.axes = self.figure.add_subplot(111)
@@ -131,24 +230,26 @@ class Graph (object):
 
         # Do date formatting of axis labels if the X column is a date field
         if self['dateformat']:
-            self.add_date_labels(min(x_values), max(x_values))
+            if isinstance(x_values, list):
+                self.add_date_labels(min(x_values), max(x_values))
+            else:
+                # Leave out timestamps that couldn't be parsed (NaT)
+                valid = x_values[~utils.import_numpy().isnat(x_values)]
+                if not len(valid):
+                    raise ValueError("No dates found in column '%s'" %
+                                     x_column)
+                self.add_date_labels(valid.min(), valid.max())
             self.figure.autofmt_xdate()
 
-        # Get the top n by average?
-        if self['top']:
-            y_columns = utils.top_by_average(self['top'], y_columns, y_values, self['drop'])
-            print("********** Top %d columns by average:" % self['top'])
-            print('\n'.join(y_columns))
-        # Get the top n by peak?
-        elif self['peak']:
-            y_columns = utils.top_by_peak(self['peak'], y_columns, y_values, self['drop'])
-            print("********** Top %d columns by peak:" % self['peak'])
-            print('\n'.join(y_columns))
-
-        # Plot lines for all Y columns
+        # Plot lines for all Y columns, with fewer points if there are too
+        # many to draw quickly
         lines = []
         for y_col in y_columns:
-            line = self.axes.plot(x_values, y_values[y_col], self['linestyle'])
+            x_points, y_points = x_values, y_values[y_col]
+            if self['maxpoints'] > 0:
+                x_points, y_points = utils.downsample(
+                    x_points, y_points, self['maxpoints'])
+            line = self.axes.plot(x_points, y_points, self['linestyle'])
             lines.append(line)
 
         # Set Y-limit if provided
@@ -214,6 +315,261 @@ class Graph (object):
     def show(self):
         """Display the graph in a GUI window.
         """
+        _import_pylab()
         pylab.show()
 
 
+    def close(self):
+        """Close the graph's figure, to free the memory it uses.
+        """
+        if self.figure is not None:
+            pylab.close(self.figure)
+            self.figure = None
+
+
+def save_graphs(graphs):
+    """Generate and save each of ``graphs``, a list of ``(graph, filename)``
+    pairs, closing each graph once it's saved.
+
+    Graphs of the same ``.csv`` file with the same ``x``, ``dateformat``,
+    ``gmtoffset`` and ``zerotime`` settings are all drawn from a single
+    reading of the file, so this is much faster than generating each graph
+    by itself.
+    """
+    # Group the graphs that can share values, in order
+    groups = {}
+    keys = []
+    for graph, filename in graphs:
+        key = (graph.csv_file, graph['x'], graph['dateformat'],
+               graph['gmtoffset'], graph['zerotime'])
+        if key not in groups:
+            groups[key] = []
+            keys.append(key)
+        groups[key].append((graph, filename))
+
+    for key in keys:
+        group = groups[key]
+        filenames = [filename for graph, filename in group]
+        plotted = _plot_graphs([graph for graph, filename in group])
+        for graph, filename in izip(plotted, filenames):
+            graph.save(filename)
+            graph.close()
+
+
+def _plot_graphs(graphs):
+    """Plot each of ``graphs``, all of the same ``.csv`` file and with the
+    same ``x``, ``dateformat``, ``gmtoffset`` and ``zerotime`` settings,
+    yielding each one as soon as it's plotted.
+
+    The file is read once for the columns of every graph. Graphs with
+    ``top`` or ``peak`` settings need a first reading to find the average and
+    peak of their columns; only the top columns are read in full.
+    """
+    first = graphs[0]
+    print("Reading '%s'" % first.csv_file)
+    infile = open_file(first.csv_file, 'r')
+    reader = csv.DictReader(infile)
+    fieldnames = reader.fieldnames
+
+    # Match columns for every graph
+    columns = []
+    for graph in graphs:
+        x_column, y_columns = utils.matching_xy_fields(
+            graph['x'], graph['y'], fieldnames)
+        columns.append(y_columns)
+
+    # Rank the columns of graphs showing only the top few
+    ranked = [graph['top'] or graph['peak'] for graph in graphs]
+    if any(ranked):
+        ranked_columns = _unique(y_columns for y_columns, rank
+                                 in zip(columns, ranked) if rank)
+        averages, peaks = utils.column_averages_and_peaks(
+            reader.reader, fieldnames, ranked_columns)
+        infile.close()
+        for index, graph in enumerate(graphs):
+            if ranked[index]:
+                columns[index] = graph.top_columns(
+                    columns[index], averages, peaks)
+        infile = open_file(first.csv_file, 'r')
+        reader = csv.DictReader(infile)
+
+    # Read the values for all the graphs at once
+    x_values, y_values = first.read_values(
+        reader, x_column, _unique(columns))
+    infile.close()
+
+    for graph, y_columns in zip(graphs, columns):
+        # Use the date format guessed for the first graph
+        graph['dateformat'] = first['dateformat']
+        graph.plot(x_column, y_columns, x_values, y_values)
+        yield graph
+
+
+def _unique(lists):
+    """Return a list of the distinct items in all the ``lists``, in order.
+    """
+    items = []
+    seen = set()
+    for items_list in lists:
+        for item in items_list:
+            if item not in seen:
+                seen.add(item)
+                items.append(item)
+    return items
+
+
+def read_spec(spec_file, csv_file, defaults=None):
+    """Read a JSON file describing several graphs of ``csv_file``, and
+    return a list of ``(graph, filename)`` pairs for `save_graphs`.
+
+    ``spec_file`` has a list of graphs, each an object with any `Graph`
+    settings, and the ``save`` filename. Settings for every graph may be
+    given alongside the list, and ``defaults`` gives settings for any graph
+    that doesn't have them in ``spec_file``::
+
+        {
+            "dateformat": "%m/%d/%Y %H:%M:%S.%f",
+            "graphs": [
+                {"title": "CPU", "y": ["Processor.*"], "save": "cpu.png"},
+                {"peak": 10, "truncate": 40, "save": "{name}_peak.svg"}
+            ]
+        }
+
+    ``{name}`` in a filename is replaced with the name of ``csv_file``,
+    without its directory or extension. Raise `IOError` if ``spec_file``
+    can't be read, or `ValueError` if it can't be understood.
+    """
+    with open(spec_file) as infile:
+        try:
+            spec = json.load(infile)
+        except ValueError, message:
+            raise ValueError("'%s' is not valid JSON: %s" %
+                             (spec_file, message))
+    if isinstance(spec, list):
+        spec = {'graphs': spec}
+    if not isinstance(spec, dict) or \
+       not isinstance(spec.get('graphs'), list):
+        raise ValueError("'%s' must have a list of graphs" % spec_file)
+    common = dict(defaults or {})
+    common.update((key, value) for key, value in spec.items()
+                  if key != 'graphs')
+    name = os.path.splitext(os.path.basename(csv_file))[0]
+
+    graphs = []
+    for index, graph_spec in enumerate(spec['graphs']):
+        if not isinstance(graph_spec, dict):
+            raise ValueError("Graph %d in '%s' is not an object" %
+                             (index + 1, spec_file))
+        settings = dict(common)
+        settings.update(graph_spec)
+        filename = settings.pop('save', '')
+        if not filename:
+            raise ValueError("Graph %d in '%s' has no 'save' filename" %
+                             (index + 1, spec_file))
+        graph = Graph(csv_file)
+        for key, value in settings.items():
+            graph.set(str(key), value)
+        try:
+            filename = _utf8(filename).format(name=name)
+        # Braces other than {name}
+        except (KeyError, IndexError, ValueError), error:
+            raise ValueError("Graph %d in '%s' has a bad 'save' filename"
+                             " (%s): '%s'" % (index + 1, spec_file,
+                                              error, filename))
+        graphs.append((graph, filename))
+    return graphs
+
+
+def find_csv_files(path):
+    """Return a sorted list of the ``.csv`` files in the directory ``path``,
+    or if ``path`` isn't a directory, of those whose names start with
+    ``path`` (like the files `grinder.Report.write_all_csvs` writes with a
+    given prefix).
+    """
+    if os.path.isdir(path):
+        pattern = os.path.join(path, '*.csv')
+    else:
+        pattern = path + '*.csv'
+    return sorted(glob.glob(pattern))
+
+
+def render_graphs(csv_files, settings=None, jobs=1, extension='png',
+                  spec_file=None):
+    """Save a graph of each of ``csv_files``, with the non-interactive Agg
+    backend, in a pool of ``jobs`` processes. Each graph has the given
+    ``settings``, and is saved next to its ``.csv`` file with the given
+    ``extension`` in place of ``.csv``. With a ``spec_file``, the graphs
+    described in it (see `read_spec`) are saved for each file instead.
+
+    Yield ``(csv_file, filenames, seconds, error)`` for each file, in order,
+    as soon as it's done: the graph files saved, how long it took, and an
+    error message if the graphs couldn't be made (or ``None``). Nothing is
+    printed while the graphs are drawn.
+    """
+    tasks = [(csv_file, settings or {}, extension, spec_file)
+             for csv_file in csv_files]
+    if jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(jobs, _forget_fonts)
+        try:
+            for result in pool.imap(_render_file, tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            yield _render_file(task)
+
+
+def _forget_fonts():
+    """Drop any fonts matplotlib loaded before this process was forked, for
+    `render_graphs`. They share open files with the parent's fonts, and
+    reading them from several processes at once can fail to load glyphs.
+    """
+    font_manager = sys.modules.get('matplotlib.font_manager')
+    get_font = getattr(font_manager, '_get_font', None)
+    if hasattr(get_font, 'cache_clear'):
+        get_font.cache_clear()
+
+
+def _render_file(args):
+    """Save the graphs of one ``.csv`` file, for `render_graphs`. Takes a
+    single ``(csv_file, settings, extension, spec_file)`` tuple so it can be
+    passed to `multiprocessing.Pool.imap`.
+    """
+    csv_file, settings, extension, spec_file = args
+    start = time.time()
+    # Results are reported by the caller, so keep the graphs quiet
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        _import_pylab('Agg')
+        if spec_file:
+            graphs = read_spec(spec_file, csv_file, settings)
+        else:
+            graph = Graph(csv_file)
+            for name, value in settings.items():
+                graph.set(name, value)
+            filename = os.path.splitext(csv_file)[0] + '.' + extension
+            graphs = [(graph, filename)]
+        save_graphs(graphs)
+    # Any error is reported for this file, and the others carry on
+    except Exception, error:
+        message = str(error) or error.__class__.__name__
+        return (csv_file, [], time.time() - start, message)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return (csv_file, [filename for graph, filename in graphs],
+            time.time() - start, None)
+
+
+def _utf8(value):
+    """Return ``value`` as a string, encoding it as UTF-8 if it's Unicode
+    (as strings read from JSON are).
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
@@ -46,9 +46,19 @@ import os
 import shlex
 import csv
 import re
+import math
+import json
+import hashlib
+import cPickle as pickle
+import multiprocessing
+from array import array
 from glob import glob
 from datetime import datetime
 
+from csvsee import compressed
+from csvsee.compressed import open_file
+from csvsee.utils import INT_TYPECODE
+
 
 def get_test_names(outfile):
     """Return a dict of ``{number: name}`` for each test from the summary
@@ -57,7 +67,7 @@ def get_test_names(outfile):
     """
     summary_tests = {}
     webtest_tests = {}
-    for line in open(outfile, 'r'):
+    for line in open_file(outfile, 'r'):
         # Look for summary lines
         if line.lstrip('(').startswith('Test '):
             fields = shlex.split(line)
@@ -82,6 +92,39 @@ class NoTestNames (Exception):
     pass
 
 
+def _stat_value(row, stat):
+    """Return the integer value of ``stat`` in a ``data*`` file ``row``.
+    """
+    # FIXME: Tally up all HTTP response codes instead of only checking
+    # for this one (since it makes no sense to add numeric HTTP
+    # response codes together)
+    if stat == '503 Errors':
+        if row['HTTP response code'].find('503') >= 0:
+            return 1
+        return 0
+    else:
+        return int(row[stat])
+
+
+def percentile_stat(stat):
+    """If ``stat`` names a percentile of one of `Test.percentile_stats`,
+    return ``(base_stat, percent)``; otherwise, return ``None``.
+
+        >>> percentile_stat('Test time p90')
+        ('Test time', 90)
+        >>> percentile_stat('Time to first byte max')
+        ('Time to first byte', 100)
+        >>> percentile_stat('Test time') is None
+        True
+
+    """
+    for base_stat in Test.percentile_stats:
+        for percent, suffix in Test.percentiles:
+            if stat == base_stat + ' ' + suffix:
+                return (base_stat, percent)
+    return None
+
+
 class Bin:
     """Accumulated statistics for an interval of time.
     """
@@ -100,14 +143,7 @@ class Bin:
         All statistics are accumulated as integers.
         """
         for stat in self.stats:
-            # FIXME: Tally up all HTTP response codes instead of only checking
-            # for this one (since it makes no sense to add numeric HTTP
-            # response codes together)
-            if stat == '503 Errors':
-                if row['HTTP response code'].find('503') >= 0:
-                    self.stats[stat] += 1
-            else:
-                self.stats[stat] += int(row[stat])
+            self.stats[stat] += _stat_value(row, stat)
         self.count += 1
 
 
@@ -120,8 +156,95 @@ class Bin:
             return 0
 
 
+class Histogram (object):
+    """A histogram of integer values for estimating percentiles, without
+    keeping every value. Values are counted in logarithmic buckets, each
+    about 4.4% wider than the last, so estimated percentiles are within
+    about 2.2% of the true values. Memory use is bounded by the number of
+    distinct buckets, no matter how many values are added.
+
+        >>> h = Histogram()
+        >>> for value in range(1, 1001):
+        ...     h.add(value)
+        >>> h.percentile(50), h.percentile(90), h.percentile(100)
+        (501, 919, 1000)
+
+    Histograms can be merged, giving the same result as adding all values
+    to a single histogram.
+    """
+    __slots__ = ('buckets', 'count', 'max')
+
+    # Number of buckets each time the value doubles
+    resolution = 16
+
+    def __init__(self):
+        # Count of values in each bucket
+        self.buckets = {}
+        self.count = 0
+        # Largest value added (exact)
+        self.max = 0
+
+
+    def __getstate__(self):
+        return (self.buckets, self.count, self.max)
+
+
+    def __setstate__(self, state):
+        self.buckets, self.count, self.max = state
+
+
+    def add(self, value):
+        """Add an integer ``value`` to the histogram.
+        """
+        if value < 1:
+            bucket = 0
+        else:
+            bucket = int(math.log(value, 2) * Histogram.resolution) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+
+    def merge(self, other):
+        """Add all values counted in the ``other`` histogram to this one.
+        """
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+
+    def percentile(self, percent):
+        """Return the estimated value below which ``percent`` of the values
+        fall, as an integer. The 100th percentile is the exact maximum.
+        """
+        if self.count == 0:
+            return 0
+        if percent >= 100:
+            return self.max
+        # Nearest-rank method
+        rank = max(int(math.ceil(percent / 100.0 * self.count)), 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                break
+        if bucket == 0:
+            return 0
+        # Middle of the bucket, but never more than the maximum
+        low = 2 ** ((bucket - 1) / float(Histogram.resolution))
+        high = 2 ** (bucket / float(Histogram.resolution))
+        return min(int(round((low + high) / 2)), self.max)
+
+
 class Test:
     """Statistics for a single Test in a Grinder test run.
+
+    Statistics are stored column-wise: one `array.array` of integer sums per
+    statistic, plus an array of row counts, all indexed by
+    ``(timestamp - start) // granularity``. This keeps memory use to a few
+    machine words per interval, even for long runs with many tests.
     """
     # Statistics to sum
     sum_stats = [
@@ -140,96 +263,742 @@ class Test:
         #'Time to resolve host',
     ]
     all_stats = sum_stats + average_stats
+    # Statistics to estimate percentiles for, when enabled
+    percentile_stats = [
+        'Test time',
+        'Time to establish connection',
+        'Time to first byte',
+    ]
+    # Percentiles to report, and the suffix of each in the stat name
+    percentiles = [
+        (50, 'p50'),
+        (90, 'p90'),
+        (99, 'p99'),
+        (100, 'max'),
+    ]
 
 
-    def __init__(self, number, name, granularity=1):
+    def __init__(self, number, name, granularity=1, percentiles=False):
         """Create a Test with the given number and name, and a granularity in
-        seconds.
+        seconds. If ``percentiles`` is ``True``, a `Histogram` of each
+        statistic in `Test.percentile_stats` is kept for each interval.
         """
         self.number = number
         self.name = name
         self.granularity = granularity
-        # Bins of accumulated statistics, indexed by timestamp in seconds
-        self.bins = {}
+        # Timestamp (in seconds) of the first interval, or None if empty
+        self.start = None
+        # Number of rows accumulated in each interval
+        self.counts = array(INT_TYPECODE)
+        # Sums of each statistic in each interval (see `utils.INT_TYPECODE`
+        # for their limit)
+        self.sums = dict((stat, array(INT_TYPECODE))
+                         for stat in Test.all_stats)
+        # The same arrays, in the order of `Test.all_stats`
+        self._columns = [self.sums[stat] for stat in Test.all_stats]
+        # Histograms of each statistic, indexed by interval timestamp
+        if percentiles:
+            self.histograms = dict((stat, {}) for stat in Test.percentile_stats)
+        else:
+            self.histograms = None
+
+
+    def __len__(self):
+        """Return the number of intervals spanned by this test.
+        """
+        return len(self.counts)
+
+
+    def _index(self, timestamp):
+        """Return the array index for the interval containing ``timestamp``
+        (in seconds), growing the arrays if necessary.
+        """
+        # Truncate the timestamp to the current granularity
+        timestamp = (timestamp // self.granularity) * self.granularity
+        # First row determines where the arrays start
+        if self.start is None:
+            self.start = timestamp
+        # Earlier than any row so far; pad the front of each array
+        # (in place, so references to the arrays remain valid)
+        elif timestamp < self.start:
+            pad = array(INT_TYPECODE, [0]) * \
+                ((self.start - timestamp) // self.granularity)
+            self.counts[0:0] = pad
+            for stat in self.sums:
+                self.sums[stat][0:0] = pad
+            self.start = timestamp
+        index = (timestamp - self.start) // self.granularity
+        # Later than any row so far; pad the end of each array
+        if index >= len(self.counts):
+            pad = array(INT_TYPECODE, [0]) * (index + 1 - len(self.counts))
+            self.counts.extend(pad)
+            for stat in self.sums:
+                self.sums[stat].extend(pad)
+        return index
 
 
     def add(self, row):
         """Add a row of statistics for this test.
         """
         # Convert timestamp to seconds
-        timestamp = int(row['Start time (ms since Epoch)']) / 1000
-        # Truncate the timestamp to the current granularity
-        if self.granularity > 1:
-            timestamp = (timestamp / self.granularity) * self.granularity
-        # If a bin doesn't exist for this timestamp, create one
-        if timestamp not in self.bins:
-            self.bins[timestamp] = Bin(Test.all_stats)
-        # Accumulate stats
-        self.bins[timestamp].add(row)
+        timestamp = int(row['Start time (ms since Epoch)']) // 1000
+        values = [_stat_value(row, stat) for stat in Test.all_stats]
+        if self.histograms is not None:
+            values.extend(int(row[stat]) if stat in row else None
+                          for stat in Test.percentile_stats)
+        self.add_values(timestamp, values)
+
+
+    def add_values(self, timestamp, values):
+        """Add a row of statistics at ``timestamp`` (in seconds), where
+        ``values`` are the integer values of each statistic in
+        `Test.all_stats`, in the same order, optionally followed by values
+        for each statistic in `Test.percentile_stats` (or ``None`` for any
+        that are unknown).
+        """
+        self.add_batch([timestamp], [[value] if value is not None else None
+                                     for value in values])
+
+
+    def add_batch(self, timestamps, values):
+        """Add many rows of statistics at once. ``timestamps`` is a sequence
+        of row timestamps (in seconds), and ``values`` has one sequence of
+        row values for each statistic in `Test.all_stats`, in the same order.
+        Sequences of values for `Test.percentile_stats` (or ``None`` where
+        unknown) may follow. This gives the same result as calling
+        `add_values` for each row, but is much faster.
+        """
+        if not timestamps:
+            return
+        # Grow the arrays once to cover all the timestamps
+        self._index(min(timestamps))
+        self._index(max(timestamps))
+        start, granularity = self.start, self.granularity
+        indexes = [(timestamp - start) // granularity for timestamp in timestamps]
+        counts = self.counts
+        for index in indexes:
+            counts[index] += 1
+        for column, stat_values in zip(self._columns, values):
+            for index, value in zip(indexes, stat_values):
+                column[index] += value
+        if self.histograms is not None:
+            self._add_histograms(timestamps, values[len(Test.all_stats):])
+
+
+    def _add_histograms(self, timestamps, values):
+        """Add rows to the histograms for each statistic in
+        `Test.percentile_stats`, given the row ``timestamps`` and a sequence
+        of row values (or ``None``) for each statistic.
+        """
+        granularity = self.granularity
+        times = [(timestamp // granularity) * granularity
+                 for timestamp in timestamps]
+        for stat, stat_values in zip(Test.percentile_stats, values):
+            if stat_values is None:
+                continue
+            histograms = self.histograms[stat]
+            for bin_time, value in zip(times, stat_values):
+                histogram = histograms.get(bin_time)
+                if histogram is None:
+                    histogram = histograms[bin_time] = Histogram()
+                histogram.add(value)
+
+
+    def bin_at(self, timestamp):
+        """Return a `Bin` holding the statistics accumulated at the given
+        timestamp, or ``None`` if there is no data at that time.
+        """
+        index = self._lookup(timestamp)
+        if index is None:
+            return None
+        bin = Bin(self.sums.keys())
+        for stat, sums in self.sums.items():
+            bin.stats[stat] = int(sums[index])
+        bin.count = int(self.counts[index])
+        return bin
+
+
+    def merge(self, other):
+        """Add all statistics accumulated in ``other`` to this test. ``other``
+        must be a `Test` with the same granularity, or a finer granularity
+        that evenly divides this one. Since statistics are kept as sums and
+        counts, merging partial results gives exactly the same totals as
+        adding every row to a single `Test`.
+        """
+        if self.granularity % other.granularity:
+            raise ValueError("Cannot merge granularity %s into %s" %
+                             (other.granularity, self.granularity))
+        if other.start is None:
+            return
+        # Grow the arrays to cover the other test's range
+        self._index(other.start)
+        self._index(other.start + (len(other) - 1) * other.granularity)
+        # Position of the other test's first interval, in its own intervals
+        # from the start of this test
+        offset = (other.start - self.start) // other.granularity
+        ratio = self.granularity // other.granularity
+        _add_intervals(self.counts, other.counts, offset, ratio)
+        for stat, sums in other.sums.items():
+            _add_intervals(self.sums[stat], sums, offset, ratio)
+        if self.histograms is not None and other.histograms is not None:
+            granularity = self.granularity
+            for stat, histograms in other.histograms.items():
+                self_histograms = self.histograms[stat]
+                for bin_time, histogram in histograms.items():
+                    bin_time = (bin_time // granularity) * granularity
+                    if bin_time not in self_histograms:
+                        self_histograms[bin_time] = Histogram()
+                    self_histograms[bin_time].merge(histogram)
+
+
+    def rebin(self, granularity):
+        """Return a new `Test` with this test's statistics accumulated at a
+        coarser ``granularity``, which must be a multiple of this test's
+        granularity. The result is exactly the same as reading the original
+        rows with the coarser granularity.
+        """
+        test = Test(self.number, self.name, granularity,
+                    self.histograms is not None)
+        test.merge(self)
+        return test
+
+
+    def _lookup(self, timestamp):
+        """Return the array index for an interval starting exactly at
+        ``timestamp``, or ``None`` if there is no data at that time.
+        """
+        if self.start is None:
+            return None
+        offset = timestamp - self.start
+        if offset < 0 or offset % self.granularity:
+            return None
+        index = offset // self.granularity
+        if index >= len(self.counts) or self.counts[index] == 0:
+            return None
+        return index
 
 
     def timestamp_range(self):
         """Return the ``(start, end)`` timestamps for this test.
         """
-        if not self.bins:
+        if self.start is None:
             return (0, 0)
-        timestamps = sorted(self.bins.keys())
-        return (min(timestamps), max(timestamps))
+        return (self.start,
+                self.start + (len(self.counts) - 1) * self.granularity)
 
 
     def stat_at_time(self, stat, timestamp):
         """Return a statistic at the given timestamp (either sum or average).
         Return ``0`` if there is no data at the given time.
         """
-        if timestamp not in self.bins:
-            return 0
-        # Get the appropriate bin
-        bin = self.bins[timestamp]
+        return self.stat_function(stat)(timestamp)
+
+
+    def stat_function(self, stat):
+        """Return a function that takes a timestamp and returns the given
+        statistic at that time, like `stat_at_time`. The statistic is looked
+        up only once, so this is much faster when getting the same statistic
+        at many different times. Raise a `ValueError` for unknown statistics.
+        """
+        counts = self.counts
         # For summed stats, just return the total
         if stat in Test.sum_stats:
-            return bin.stats[stat]
+            value = self.sums[stat].__getitem__
         # For averaged stats, divide by count
         elif stat in Test.average_stats:
-            return (bin.stats[stat] / bin.count)
+            sums = self.sums[stat]
+            value = lambda index: sums[index] // counts[index]
         # Special handling for transaction count
         elif stat in ['transactions', 'transactions-page-requests']:
-            return bin.count
+            value = counts.__getitem__
         elif stat == 'Test time-page-requests':
-            return (bin.stats['Test time'] / bin.count)
+            sums = self.sums['Test time']
+            value = lambda index: sums[index] // counts[index]
+        # Percentiles, like 'Test time p90'
+        elif percentile_stat(stat) and self.histograms is not None:
+            base_stat, percent = percentile_stat(stat)
+            histograms = self.histograms[base_stat]
+            start, granularity = self.start, self.granularity
+            def value(index):
+                histogram = histograms.get(start + index * granularity)
+                if histogram is None:
+                    return 0
+                return histogram.percentile(percent)
         else:
             raise ValueError("Unknown stat: %s" % stat)
 
+        lookup = self._lookup
+        def stat_at(timestamp):
+            index = lookup(timestamp)
+            if index is None:
+                return 0
+            # The arrays may hold doubles (see `utils.INT_TYPECODE`)
+            return int(value(index))
+        return stat_at
+
 
     def __str__(self):
         return "%s: %s" % (self.number, self.name)
 
 
+def _add_intervals(target, source, offset, ratio):
+    """Add the values in the ``source`` array to the ``target`` array, where
+    ``source[i]`` belongs in ``target[(offset + i) // ratio]``.
+    """
+    if ratio == 1:
+        for index, value in enumerate(source):
+            if value:
+                target[offset + index] += value
+    else:
+        first = offset // ratio
+        last = (offset + len(source) - 1) // ratio
+        for index in range(first, last + 1):
+            begin = max(index * ratio - offset, 0)
+            target[index] += sum(source[begin:(index + 1) * ratio - offset])
+
+
+def data_batches(infile, chunk_size=1 << 20, percentiles=False):
+    """Read rows from the Grinder ``data*`` file object ``infile``, and yield
+    ``(test_number, timestamps, values)`` for each test found in each chunk
+    of about ``chunk_size`` bytes, suitable for passing to `Test.add_batch`.
+    If ``percentiles`` is ``True``, values for `Test.percentile_stats` are
+    included.
+
+    Column positions are found from the header line once, and rows are
+    converted to integers a whole chunk at a time, so this is several times
+    faster than reading rows with `csv.DictReader`. Blank or incomplete lines
+    are skipped. Raise a `ValueError` if the header is missing any required
+    column.
+    """
+    columns = _data_columns(infile.readline())
+    for lines in _line_chunks(infile, chunk_size):
+        for batch in _line_batches(lines, columns, percentiles):
+            yield batch
+
+
+def _data_columns(header_line):
+    """Return ``(test_col, time_col, code_col, stat_cols, percentile_cols,
+    width)`` column positions from the header line of a Grinder ``data*``
+    file. Any of `Test.percentile_stats` not in the file have a position of
+    ``None``.
+    """
+    header = [field.strip() for field in header_line.split(',')]
+    try:
+        test_col = header.index('Test')
+        time_col = header.index('Start time (ms since Epoch)')
+        code_col = header.index('HTTP response code')
+        stat_cols = [header.index(stat) for stat in Test.all_stats
+                     if stat != '503 Errors']
+    except ValueError:
+        raise ValueError("Not a Grinder data file header: %s" % ', '.join(header))
+    percentile_cols = [header.index(stat) if stat in header else None
+                       for stat in Test.percentile_stats]
+    return (test_col, time_col, code_col, stat_cols, percentile_cols,
+            len(header))
+
+
+def _line_chunks(infile, chunk_size=1 << 20, partial=True):
+    """Yield lists of lines read from ``infile``, about ``chunk_size`` bytes
+    at a time. If ``partial`` is ``False``, an incomplete line at the end of
+    the file (one with no newline yet) is left unread.
+    """
+    leftover = ''
+    while True:
+        chunk = infile.read(chunk_size)
+        if not chunk:
+            break
+        chunk = leftover + chunk
+        end = chunk.rfind('\n') + 1
+        leftover = chunk[end:]
+        if end:
+            yield chunk[:end].splitlines(True)
+    if partial and leftover:
+        yield [leftover]
+
+
+def _line_batches(lines, columns, percentiles=False):
+    """Yield ``(test_number, timestamps, values)`` for each test found in
+    ``lines`` from a Grinder ``data*`` file, given the ``columns`` positions
+    returned by `_data_columns`. If ``percentiles`` is ``True``, values for
+    `Test.percentile_stats` are included.
+    """
+    test_col, time_col, code_col, stat_cols, percentile_cols, width = columns
+    # '503 Errors' is counted from the response code; this is where it
+    # belongs among the other statistics
+    errors_503 = Test.all_stats.index('503 Errors')
+
+    # Group rows by test number
+    test_rows = {}
+    needed = [test_col, time_col, code_col] + list(stat_cols)
+    if percentiles:
+        needed.extend(col for col in percentile_cols if col is not None)
+    for row in _int_rows(lines, width, needed):
+        test_rows.setdefault(row[test_col], []).append(row)
+    for number, rows in test_rows.items():
+        # Transpose rows into columns
+        columns = zip(*rows)
+        timestamps = [start // 1000 for start in columns[time_col]]
+        values = [columns[col] for col in stat_cols]
+        values.insert(errors_503,
+                      [1 if code == 503 else 0 for code in columns[code_col]])
+        if percentiles:
+            values.extend(columns[col] if col is not None else None
+                          for col in percentile_cols)
+        yield (number, timestamps, values)
+
+
+def _int_rows(lines, width, needed):
+    """Return a list of rows of integers from the given comma-separated
+    ``lines``, skipping any rows with fewer than ``width`` fields. Only the
+    fields at the ``needed`` positions must be integers; if any other field
+    isn't, it's ``None``.
+    """
+    # Data file lines are plain comma-separated integers, which makes them
+    # valid JSON lists; decoding them all at once is much faster than
+    # calling int() on each field.
+    text = '],['.join(line.strip() for line in lines)
+    try:
+        rows = json.loads('[[' + text + ']]')
+    # Not all integers; convert each line by itself
+    except ValueError:
+        rows = [_int_row(line, needed) for line in lines
+                if line.count(',') >= width - 1]
+    return [row for row in rows if len(row) >= width]
+
+
+def _int_row(line, needed):
+    """Return a list of the fields in ``line``, with those at the ``needed``
+    positions converted to integers, and any others that aren't integers
+    as ``None``.
+    """
+    try:
+        return json.loads('[' + line.strip() + ']')
+    except ValueError:
+        fields = line.split(',')
+        row = [None] * len(fields)
+        for col in needed:
+            row[col] = int(fields[col])
+        return row
+
+
+def _read_new_rows(datafile, offset, tests, granularity, follow=False,
+                   new_tests=False, percentiles=False):
+    """Add rows from the Grinder ``datafile``, starting at byte ``offset``,
+    to the ``{number: Test}`` dict ``tests``, and return the offset of the
+    first byte not read.
+
+    If ``follow`` is ``True``, the file may still be growing, so an
+    incomplete last line is left unread. If ``new_tests`` is ``True``,
+    unknown test numbers get a new unnamed `Test` (keeping ``percentiles``
+    if that is ``True``); otherwise, their rows are ignored.
+    """
+    infile = open_file(datafile, 'r')
+    try:
+        header = infile.readline()
+        # Header isn't completely written yet
+        if not header.endswith('\n'):
+            return 0
+        columns = _data_columns(header)
+        infile.seek(max(offset, len(header)))
+        offset = infile.tell()
+
+        for lines in _line_chunks(infile, partial=not follow):
+            offset += sum(len(line) for line in lines)
+            for (number, timestamps, values) in _line_batches(
+                    lines, columns, percentiles):
+                test = tests.get(number)
+                if test is None and new_tests:
+                    test = tests[number] = Test(number, '', granularity,
+                                                percentiles)
+                if test is not None:
+                    test.add_batch(timestamps, values)
+    finally:
+        infile.close()
+    return offset
+
+
+def _read_datafile(args):
+    """Return ``(tests, offset)`` where ``tests`` is a dict of ``{number:
+    Test}`` with statistics for the given test numbers from a single Grinder
+    ``data*`` file, and ``offset`` is the number of bytes read. Takes a
+    single ``(datafile, granularity, test_numbers, follow, percentiles)``
+    tuple so it can be passed to `multiprocessing.Pool.map`. If
+    ``test_numbers`` is ``None``, statistics for all tests in the file are
+    returned.
+    """
+    datafile, granularity, test_numbers, follow, percentiles = args
+    tests = dict((number, Test(number, None, granularity, percentiles))
+                 for number in test_numbers or [])
+    offset = _read_new_rows(datafile, 0, tests, granularity, follow,
+                            new_tests=(follow or test_numbers is None),
+                            percentiles=percentiles)
+    return (tests, offset)
+
+
+# Change this whenever the cache file contents change
+_CACHE_VERSION = 1
+
+def _cache_key(datafile):
+    """Return a key identifying the current contents of ``datafile``, for
+    checking whether its cached statistics are still valid.
+    """
+    info = os.stat(datafile)
+    return (_CACHE_VERSION, os.path.abspath(datafile), info.st_size,
+            info.st_mtime, INT_TYPECODE, array(INT_TYPECODE).itemsize,
+            Test.all_stats)
+
+
+def _cache_filename(cache_dir, datafile):
+    """Return the name of the cache file for ``datafile`` in ``cache_dir``.
+    """
+    path = os.path.abspath(datafile)
+    return os.path.join(cache_dir, hashlib.md5(path).hexdigest() + '.cache')
+
+
+def _load_cache(cache_dir, datafile):
+    """Return ``(tests, offset)`` for ``datafile`` from the cache in
+    ``cache_dir``, or ``None`` if there is no cache file for it, or if the
+    data file has changed since it was cached.
+    """
+    try:
+        cache_file = open(_cache_filename(cache_dir, datafile), 'rb')
+        key, offset, cached_tests = pickle.load(cache_file)
+        cache_file.close()
+    # Missing or unreadable cache files are rebuilt
+    except Exception:
+        return None
+    if key != _cache_key(datafile):
+        return None
+
+    tests = {}
+    for number, (start, counts, sums) in cached_tests.items():
+        test = Test(number, None, 1)
+        test.start = start
+        test.counts.fromstring(counts)
+        for stat, stat_sums in zip(Test.all_stats, sums):
+            test.sums[stat].fromstring(stat_sums)
+        tests[number] = test
+    return (tests, offset)
+
+
+def _save_cache(cache_dir, datafile, key, tests, offset):
+    """Save 1-second ``tests`` statistics and the ``offset`` read for
+    ``datafile`` in ``cache_dir``, identified by ``key`` as returned by
+    `_cache_key` before the file was read.
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # Arrays are saved as their raw machine values
+    cached_tests = dict(
+        (number, (test.start, test.counts.tostring(),
+                  [test.sums[stat].tostring() for stat in Test.all_stats]))
+        for number, test in tests.items())
+    # Write to a temporary file and rename it, so readers never see a
+    # partially-written cache file
+    cache_filename = _cache_filename(cache_dir, datafile)
+    temp_filename = '%s.%d' % (cache_filename, os.getpid())
+    cache_file = open(temp_filename, 'wb')
+    pickle.dump((key, offset, cached_tests), cache_file, 2)
+    cache_file.close()
+    os.rename(temp_filename, cache_filename)
+
+
 class Report:
     """A report of statistics for a Grinder test run.
     """
-    def __init__(self, granularity, grinder_outfile, *grinder_datafiles):
+    def __init__(self, granularity, grinder_outfile, *grinder_datafiles,
+                 **kwargs):
+        """Create a report from the given Grinder ``out*`` file and
+        ``data*`` files. Keyword arguments:
+
+            workers
+                Number of processes to use for reading ``data*`` files.
+                With more than one, each file is read in a separate process
+                and the partial statistics are merged afterwards.
+
+            follow
+                If ``True``, the Grinder run may still be in progress. Call
+                `refresh` to read any rows written to the data files since
+                they were last read.
+
+            cache_dir
+                Directory for caching each data file's statistics at 1-second
+                granularity. Cached statistics are re-binned to the report's
+                granularity instead of reading the data file again, unless
+                the file's size or modification time has changed. Not used
+                with ``follow`` or ``percentiles``.
+
+            percentiles
+                If ``True``, keep a `Histogram` of each statistic in
+                `Test.percentile_stats` for each interval, so percentiles
+                like ``'Test time p90'`` can be reported.
+
+        """
         self.granularity = granularity
         self.outfile = grinder_outfile
         self.datafiles = grinder_datafiles
+        self.workers = kwargs.pop('workers', 1)
+        self.follow = kwargs.pop('follow', False)
+        self.cache_dir = kwargs.pop('cache_dir', None)
+        self.percentiles = kwargs.pop('percentiles', False)
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments: %s" %
+                            ', '.join(kwargs))
         self.tests = {}
+        # Number of bytes read so far from each data file
+        self.offsets = dict((datafile, 0) for datafile in self.datafiles)
+        # Tests at each granularity, rolled up from self.tests as needed
+        self.levels = {granularity: self.tests}
         self.populate_stats()
 
 
     def populate_stats(self):
         """Add statistics for all tests in all Grinder data files.
         """
-        # Get test (number, name) pairs
-        for (number, name) in get_test_names(self.outfile).iteritems():
-            self.tests[number] = Test(number, name, self.granularity)
+        self.update_test_names()
 
-        if not self.tests:
+        # A run in progress may not have logged any test names yet
+        if not self.tests and not self.follow:
             raise NoTestNames("No test names found in '%s'" % self.outfile)
 
+        # Histograms aren't cached
+        if self.cache_dir and not (self.follow or self.percentiles):
+            self.populate_stats_cached()
+        # Read files in parallel if there is more than one to read
+        elif self.workers > 1 and len(self.datafiles) > 1:
+            self.populate_stats_parallel()
+        else:
+            for datafile in self.datafiles:
+                print("Getting test stats from %s" % datafile)
+                self.read_datafile(datafile)
+
+
+    def update_test_names(self):
+        """Get test names from the Grinder ``out*`` file, and create a `Test`
+        for each one not already in the report.
+        """
+        for (number, name) in get_test_names(self.outfile).iteritems():
+            if number in self.tests:
+                self.tests[number].name = name
+            else:
+                self.tests[number] = Test(number, name, self.granularity,
+                                          self.percentiles)
+
+
+    def read_datafile(self, datafile):
+        """Add statistics from any rows in ``datafile`` that haven't been read
+        yet, and return the number of bytes read.
+        """
+        offset = self.offsets[datafile]
+        # Tests in a run in progress may not have names logged yet
+        self.offsets[datafile] = _read_new_rows(
+            datafile, offset, self.tests, self.granularity,
+            follow=self.follow, new_tests=self.follow,
+            percentiles=self.percentiles)
+        return self.offsets[datafile] - offset
+
+
+    def refresh(self):
+        """Update test names and add statistics from all rows written to the
+        data files since they were last read. Return the number of bytes read.
+        This is meant for reports created with ``follow=True``; the last,
+        partially-filled interval keeps accumulating as new rows arrive.
+        """
+        self.update_test_names()
+        bytes_read = sum(self.read_datafile(datafile)
+                         for datafile in self.datafiles)
+        # Coarser levels need to be rolled up again
+        self.levels = {self.granularity: self.tests}
+        return bytes_read
+
+
+    def tests_at(self, granularity=None):
+        """Return a dict of ``{number: Test}`` with statistics at the given
+        ``granularity``, which must be a multiple of the report's granularity.
+        The default is the report's granularity.
+
+        Statistics at coarser granularities are rolled up from the coarsest
+        level already available that evenly divides ``granularity``, and kept
+        for later calls; so asking for 10, 60 and 600 seconds in that order
+        sums 600-second intervals from the 60-second ones, and so on.
+        """
+        if granularity is None:
+            granularity = self.granularity
+        if granularity % self.granularity:
+            raise ValueError("Granularity %s is not a multiple of %s" %
+                             (granularity, self.granularity))
+        if granularity not in self.levels:
+            base = max(level for level in self.levels if granularity % level == 0)
+            self.levels[granularity] = dict(
+                (number, test.rebin(granularity))
+                for number, test in self.levels[base].items())
+        return self.levels[granularity]
+
+
+    def populate_stats_parallel(self):
+        """Read all Grinder data files in a pool of ``self.workers``
+        processes, and merge the statistics from each one.
+        """
+        print("Getting test stats from %d files using %d processes" %
+              (len(self.datafiles), self.workers))
+        jobs = [(datafile, self.granularity, list(self.tests.keys()),
+                 self.follow, self.percentiles)
+                for datafile in self.datafiles]
+        for datafile, (tests, offset) in zip(self.datafiles,
+                                             self._map(_read_datafile, jobs)):
+            print("Merging test stats from %s" % datafile)
+            for number, test in tests.items():
+                if number not in self.tests:
+                    self.tests[number] = Test(number, '', self.granularity,
+                                              self.percentiles)
+                self.tests[number].merge(test)
+            self.offsets[datafile] = offset
+
+
+    def populate_stats_cached(self):
+        """Add statistics from each data file's cached 1-second statistics,
+        re-binned to the report's granularity. Data files that aren't cached
+        yet, or have changed since they were cached, are read and cached.
+        """
+        cached = {}
+        uncached = []
         for datafile in self.datafiles:
-            print("Getting test stats from %s" % datafile)
-            data = csv.DictReader(open(datafile, 'r'), skipinitialspace=True)
-            for row in data:
-                self.add(row)
+            cached[datafile] = _load_cache(self.cache_dir, datafile)
+            if cached[datafile]:
+                print("Getting cached test stats for %s" % datafile)
+            else:
+                print("Getting test stats from %s" % datafile)
+                uncached.append(datafile)
+
+        # Read all tests in uncached files at 1-second granularity
+        keys = [_cache_key(datafile) for datafile in uncached]
+        jobs = [(datafile, 1, None, False, False) for datafile in uncached]
+        for datafile, key, (tests, offset) in zip(uncached, keys,
+                                                  self._map(_read_datafile, jobs)):
+            print("Caching test stats for %s" % datafile)
+            _save_cache(self.cache_dir, datafile, key, tests, offset)
+            cached[datafile] = (tests, offset)
+
+        for datafile in self.datafiles:
+            tests, offset = cached[datafile]
+            for number, test in tests.items():
+                if number in self.tests:
+                    self.tests[number].merge(test)
+            self.offsets[datafile] = offset
+
+
+    def _map(self, function, jobs):
+        """Return ``map(function, jobs)``, using a pool of ``self.workers``
+        processes if there is more than one worker and more than one job.
+        """
+        if self.workers < 2 or len(jobs) < 2:
+            return [function(job) for job in jobs]
+        pool = multiprocessing.Pool(min(self.workers, len(jobs)))
+        try:
+            return pool.map(function, jobs)
+        finally:
+            pool.close()
+            pool.join()
 
 
     def add(self, row):
@@ -247,25 +1016,37 @@ class Report:
             test.add(row)
 
 
-    def timestamp_range(self):
+    def timestamp_range(self, granularity=None):
         """Return the ``(start, end)`` timestamps for this report, based
-        on the timestamps of all tests within it.
+        on the timestamps of all tests within it, at the given granularity
+        (by default, the report's granularity).
         """
-        # Get all (start, end) ranges from the tests
-        ranges = [test.timestamp_range() for test in self.tests.values()]
+        # Get all (start, end) ranges from the tests having any data
+        ranges = [test.timestamp_range()
+                  for test in self.tests_at(granularity).values()
+                  if len(test) > 0]
+        if not ranges:
+            return (0, 0)
         # Using list() here to future-proof
         start_times, end_times = list(zip(*ranges))
         return (min(start_times), max(end_times))
 
 
-    def write_csv(self, stat, filename):
-        """Write the given statistic for all tests to ``filename``.
+    def has_data(self):
+        """Return ``True`` if any test in this report has statistics.
         """
-        # Open the CSV file for writing
-        csv_writer = csv.writer(open(filename, 'w'))
+        return any(len(test) > 0 for test in self.tests.values())
+
 
+    def csv_test_numbers(self, stat):
+        """Return the sorted test numbers to include in a CSV report of
+        the given statistic.
+        """
         # Test number determines the order of columns
         test_numbers = sorted(self.tests.keys())
+        # Percentiles are filtered the same as the stat they're taken from
+        if percentile_stat(stat):
+            stat = percentile_stat(stat)[0]
 
         # Certain kinds of stat need certain test numbers filtered out.
         # For page-requests, only include test numbers ending in 00
@@ -277,11 +1058,16 @@ class Report:
         # For all other stats, include all test numbers
         else:
             pass
+        return test_numbers
+
 
+    def csv_header(self, test_numbers):
+        """Return the CSV header row for the given test numbers.
+        """
         # OOCalc has a hard limit of 65535 characters in a single line of a
         # .csv file. Figure out where to truncate the test names so they will
         # all fit in the header row.
-        trunc_length = 65000 / len(test_numbers)
+        trunc_length = 65000 // max(len(test_numbers), 1)
 
         # Assemble the header row
         header = ['GMT']
@@ -289,61 +1075,131 @@ class Report:
         for test_num in test_numbers:
             trunc_name = str(self.tests[test_num])[:trunc_length]
             header.append(trunc_name)
-        # Write the header row
-        csv_writer.writerow(header)
+        return header
+
+
+    def write_csv(self, stat, filename):
+        """Write the given statistic for all tests to ``filename``.
+        """
+        self.write_csvs([(stat, filename)])
+
+
+    def write_csvs(self, stat_files, granularity=None):
+        """Write CSV files for a list of ``(stat, filename)`` pairs, in a
+        single pass over the report's timestamps. Statistics are written at
+        the given ``granularity`` (by default, the report's granularity).
+        """
+        tests = self.tests_at(granularity)
+        granularity = granularity or self.granularity
+        outfiles = []
+        writers = []
+        functions = []
+        for stat, filename in stat_files:
+            # Open the CSV file for writing
+            outfile = open(filename, 'w')
+            csv_writer = csv.writer(outfile)
+            test_numbers = self.csv_test_numbers(stat)
+            # Write the header row
+            csv_writer.writerow(self.csv_header(test_numbers))
+            outfiles.append(outfile)
+            writers.append(csv_writer)
+            functions.append([tests[test_num].stat_function(stat)
+                              for test_num in test_numbers])
 
         # Assemble and write each row, sorted by timestamp
-        start_time, end_time = self.timestamp_range()
+        start_time, end_time = self.timestamp_range(granularity)
+        # No data yet while following a live run; only write the headers.
+        # Otherwise, an empty report has a single row at timestamp 0.
+        if self.follow and not self.has_data():
+            end_time = start_time - 1
         this_time = start_time
         while this_time <= end_time:
             timestamp = datetime.utcfromtimestamp(this_time)
             timestamp = datetime.strftime(timestamp, '%m/%d/%Y %H:%M:%S') + '.000'
-            row = [timestamp]
-            for test_num in test_numbers:
-                row.append(self.tests[test_num].stat_at_time(stat, this_time))
-            # Write the row
-            csv_writer.writerow(row)
+            for csv_writer, stat_functions in zip(writers, functions):
+                row = [timestamp]
+                row.extend(stat_at(this_time) for stat_at in stat_functions)
+                # Write the row
+                csv_writer.writerow(row)
             # Step to the next timestamp
-            this_time += self.granularity
+            this_time += granularity
 
+        for outfile in outfiles:
+            outfile.close()
 
-    def write_all_csvs(self, csv_prefix):
+
+    def write_all_csvs(self, csv_prefix, granularities=None):
         """Write all CSV files for this report to files with the given prefix.
+
+        If a list of ``granularities`` is given, all CSV files are written at
+        each one, with the granularity added to the prefix (for example,
+        ``my_results_600s_Test_time.csv``). Each granularity must be a
+        multiple of the report's granularity.
         """
+        if granularities is None:
+            self._write_all_csvs(csv_prefix, self.granularity)
+        else:
+            # Roll up from finest to coarsest
+            for granularity in sorted(granularities):
+                prefix = "%s_%ds" % (csv_prefix, granularity)
+                self._write_all_csvs(prefix, granularity)
+
+
+    def _write_all_csvs(self, csv_prefix, granularity):
+        """Write all CSV files at the given granularity to files with the
+        given prefix.
+        """
+        stat_files = []
+
         # Specific stats
         for stat in Test.all_stats:
             csv_filename = "%s_%s.csv" % (csv_prefix, stat.replace(' ', '_'))
-            print("Writing %s" % csv_filename)
-            self.write_csv(stat, csv_filename)
+            stat_files.append((stat, csv_filename))
 
         # Transaction counts
         csv_filename = "%s_Transaction_count.csv" % csv_prefix
-        print("Writing %s" % csv_filename)
-        self.write_csv('transactions', csv_filename)
+        stat_files.append(('transactions', csv_filename))
 
         # Transaction counts - page requests
         csv_filename = "%s_Transaction_count_page_requests_only.csv" % csv_prefix
-        print("Writing %s" % csv_filename)
-        self.write_csv('transactions-page-requests', csv_filename)
+        stat_files.append(('transactions-page-requests', csv_filename))
 
         # Test time - page requests
         csv_filename = "%s_Test-time_page_requests_only.csv" % csv_prefix
-        print("Writing %s" % csv_filename)
-        self.write_csv('Test time-page-requests', csv_filename)
+        stat_files.append(('Test time-page-requests', csv_filename))
+
+        # Percentiles, like 'Test time p90'
+        if self.percentiles:
+            for base_stat in Test.percentile_stats:
+                for percent, suffix in Test.percentiles:
+                    stat = base_stat + ' ' + suffix
+                    csv_filename = "%s_%s.csv" % (csv_prefix, stat.replace(' ', '_'))
+                    stat_files.append((stat, csv_filename))
+
+        for stat, csv_filename in stat_files:
+            print("Writing %s" % csv_filename)
+        self.write_csvs(stat_files, granularity)
 
 
 
 def grinder_files(include_dir):
     """Return a list of full pathnames to all ``out*`` and ``data*`` files
-    found in descendants of ``include_dir``.
+    found in descendants of ``include_dir``. Compressed files (like
+    ``data_0.log.gz``) are included too.
     """
     if not os.path.exists(include_dir):
         raise ValueError("No such directory: %s" % include_dir)
 
+    def log_files(path, pattern):
+        filenames = glob(os.path.join(path, pattern))
+        for extension in compressed.extensions:
+            filenames.extend(glob(os.path.join(path, pattern + extension)))
+        return filenames
+
     out_data_files = []
     for (path, dirs, files) in os.walk(include_dir):
-        outfiles = glob(os.path.join(path, 'out_*.log'))
-        datafiles = sorted(glob(os.path.join(path, 'data_*.log')))
+        outfiles = log_files(path, 'out_*.log')
+        datafiles = sorted(log_files(path, 'data_*.log'))
         if outfiles and datafiles:
             out_data_files.append((outfiles[0], datafiles))
 
@@ -3,12 +3,51 @@
 """Shared utility functions for the csvsee library.
 """
 
+import os
 import csv
 import re
 import sys
+import time
+import operator
+from array import array
+from itertools import islice, compress
 from datetime import datetime, timedelta
 
 from csvsee import dates
+from csvsee.compressed import open_file, is_compressed, DecompressedFile
+
+# Typecode for arrays of counts and sums that can grow large. A C long is 64
+# bits on most platforms, but only 32 on Windows, where sums over 2**31 - 1
+# (like 25 days of response times in ms, summed in one interval) would
+# overflow; there, doubles are used instead, which hold whole numbers exactly
+# up to 2**53. Values are converted back to ``int`` as they're read out.
+INT_TYPECODE = 'l' if array('l').itemsize >= 8 else 'd'
+
+# Set by `import_numpy` when NumPy is first needed, since importing it takes
+# longer than anything else most commands do. NumPy is optional; without it,
+# `read_xy_arrays` is unavailable.
+numpy = None
+_numpy_missing = False
+
+
+def import_numpy():
+    """Import NumPy, if it hasn't been imported yet, and return it, or
+    ``None`` if it isn't installed or is older than version 1.13, whose
+    ``datetime64`` arrays `read_xy_arrays` can't use.
+    """
+    global numpy, _numpy_missing
+    if numpy is None and not _numpy_missing:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        # isnat is new in NumPy 1.13
+        if hasattr(module, 'isnat'):
+            numpy = module
+        else:
+            _numpy_missing = True
+    return numpy
+
 
 class NoMatch (Exception):
     """Exception raised when no column name matches a given expression."""
@@ -40,7 +79,7 @@ def float_or_0(value):
 def column_names(csv_file):
     """Return a list of column names in the given ``.csv`` file.
     """
-    reader = csv.DictReader(open(csv_file, 'r'))
+    reader = csv.DictReader(open_file(csv_file, 'r'))
     return reader.fieldnames
 
 
@@ -74,28 +113,201 @@ def strip_prefix(strings):
     return (prefix.strip(), stripped)
 
 
+class MultiMatch:
+    """Finds which of many regular expressions match a line of text, faster
+    than searching for each one in turn.
+
+        >>> multi = MultiMatch(['Stunned', 'daisies$', 'fjords'])
+        >>> multi.matches('Pushing up the daisies')
+        ['daisies$']
+        >>> multi.matches('Stunned, pining for the fjords')
+        ['Stunned', 'fjords']
+        >>> multi.matches('Resting')
+        []
+
+    All the expressions are first combined into a single regular expression,
+    so most lines that match none of them are rejected with one search.
+    Expressions without any special characters are found with a plain
+    substring search.
+    """
+    def __init__(self, patterns):
+        """Create a matcher for a list of regular expression ``patterns``.
+        """
+        self.patterns = list(patterns)
+        # Plain text patterns
+        self._literals = []
+        # Compiled patterns that can be combined
+        self._regexps = []
+        # Compiled patterns that must always be searched for separately
+        self._separate = []
+        for pattern in self.patterns:
+            if not _special_chars.search(pattern):
+                self._literals.append(pattern)
+            elif _uncombinable.search(pattern):
+                self._separate.append(re.compile(pattern))
+            else:
+                self._regexps.append(re.compile(pattern))
+
+        # Alternation of all patterns that can be combined, or None
+        combinable = self._literals + [expr.pattern for expr in self._regexps]
+        try:
+            self._combined = re.compile('|'.join(combinable))
+        # Too many groups, or duplicate group names
+        except (re.error, AssertionError, OverflowError):
+            self._combined = None
+        if not combinable:
+            self._combined = None
+
+
+    def matches(self, line):
+        """Return a list of the patterns that match ``line``, in no
+        particular order. A pattern given more than once is listed once
+        for each time it was given.
+        """
+        if not self._combined or self._combined.search(line):
+            found = [pattern for pattern in self._literals if pattern in line]
+            found.extend(expr.pattern for expr in self._regexps
+                         if expr.search(line))
+        else:
+            found = []
+        if self._separate:
+            found.extend(expr.pattern for expr in self._separate
+                         if expr.search(line))
+        return found
+
+# Characters with special meaning in regular expressions
+_special_chars = re.compile(r'[.^$*+?{}\[\]\\|()]')
+# Backreferences, conditionals and inline flags, whose meaning would change
+# if combined with other patterns
+_uncombinable = re.compile(r'\\\d|\(\?[iLmsux(]|\(\?P=')
+
+
 def grep_files(filenames, matches, dateformat='guess', resolution=60,
-               show_progress=True):
+               show_progress=True, jobs=1, sparse=False):
     """Search all the given files for matching text, and return a list of
     ``(timestamp, counts)`` for each match, where ``timestamp`` is a
     ``datetime``, and ``counts`` is a dictionary of ``{match: count}``,
     counting the number of times each match was found during intervals of
     ``resolution`` seconds.
+
+    If ``jobs`` is more than 1, each file is split into chunks that are
+    searched in a pool of ``jobs`` processes, giving the same result. If
+    ``sparse`` is true, intervals where nothing matched are left out.
+    """
+    return [(timestamp, dict(zip(matches, counts)))
+            for (timestamp, counts) in grep_counts(
+                filenames, matches, dateformat, resolution, show_progress,
+                jobs, sparse)]
+
+
+def grep_counts(filenames, matches, dateformat='guess', resolution=60,
+                show_progress=True, jobs=1, sparse=False, stream=False):
+    """Search all the given files for matching text like `grep_files`, and
+    yield ``(timestamp, counts)`` for each interval in order, where
+    ``counts`` is a list of the number of times each of ``matches`` was
+    found.
+
+    While searching, the counts for each interval are kept in a compact
+    array. If ``stream`` is true, each interval is yielded as soon as a
+    later one begins, so memory use stays the same however long the logs
+    are. The files must then be given in time order, and `ValueError` is
+    raised if their timestamps go back to an interval that's already been
+    yielded. Lines before the first timestamp in a file are then counted
+    with the last timestamp of the file before it, rather than with the
+    fake 1970 timestamp used for lines before any timestamp.
+    """
+    columns = _match_columns(matches)
+    rows = _Counts(columns, sparse)
+    if jobs > 1:
+        steps = _grep_steps_parallel(filenames, matches, dateformat,
+                                     resolution, jobs, show_progress, rows,
+                                     stream)
+    else:
+        steps = _grep_steps(filenames, matches, dateformat, resolution,
+                            show_progress, rows, stream)
+    order = [columns[match] for match in matches]
+
+    # Last interval yielded
+    last = None
+    for current in steps:
+        # Intervals before the current one are finished, if the timestamps
+        # never go backwards
+        if stream:
+            done = sorted(timestamp for timestamp in rows
+                          if timestamp < current)
+            for row in _pop_rows(rows, done, last, order):
+                yield row
+            if done:
+                last = done[-1]
+    for row in _pop_rows(rows, sorted(rows), last, order):
+        yield row
+
+
+def _match_columns(matches):
+    """Return a dictionary of ``{match: index}``, numbering each distinct
+    match in ``matches`` from 0.
     """
-    # Counts of each match, used as a template for each row
-    row_temp = [(match, 0) for match in matches]
-    rows = {}
+    columns = {}
+    for match in matches:
+        columns.setdefault(match, len(columns))
+    return columns
+
+
+class _Counts (dict):
+    """Match counts for `grep_counts`, as ``{timestamp: counts}``, where
+    ``counts`` is an array of integers with the count for each distinct
+    match, indexed as in ``columns``. A row of zeros is added for any
+    timestamp looked up that isn't there yet. If ``sparse`` is true, rows
+    are only added to count a match.
+    """
+    def __init__(self, columns, sparse=False):
+        dict.__init__(self)
+        self.columns = columns
+        self.sparse = sparse
+        self._zeros = array(INT_TYPECODE, [0]) * len(columns)
+
+
+    def add(self, timestamp):
+        """Add a row of zeros for ``timestamp``, if there isn't one.
+        """
+        if timestamp not in self:
+            self[timestamp] = self._zeros[:]
 
-    # Compile regular expressions for matches
-    # (Shaves off a little bit of execution time)
-    compiled_matches = [re.compile(expr) for expr in matches]
+
+    def __missing__(self, timestamp):
+        self.add(timestamp)
+        return self[timestamp]
+
+
+def _pop_rows(rows, timestamps, last, order):
+    """Remove the rows for the sorted ``timestamps`` from ``rows``, and yield
+    ``(timestamp, counts)`` for each, with counts in the ``order`` of their
+    indexes. Raise `ValueError` if they don't all come after ``last``.
+    """
+    if timestamps and last is not None and timestamps[0] <= last:
+        raise ValueError("Timestamps go back from %s to %s" %
+                         (last, timestamps[0]))
+    for timestamp in timestamps:
+        counts = rows.pop(timestamp)
+        yield (timestamp, [int(counts[index]) for index in order])
+
+
+def _grep_steps(filenames, matches, dateformat, resolution, show_progress,
+                rows, stream=False):
+    """Search each file in turn for `grep_counts`, adding the counts to
+    ``rows``. Yield the latest timestamp after every few thousand lines. If
+    ``stream`` is true, timestamps carry over from one file to the next.
+    """
+    # Match all expressions at once
+    multi_match = MultiMatch(matches)
+    timestamp = None
 
     # Read each line of each file
     for filename in filenames:
-        # Show progress bar?
+        # Show progress bar, based on how much of the file has been read?
         if show_progress:
-            num_lines = line_count(filename)
-            progress = ProgressBar(num_lines, prefix=filename, units='lines')
+            progress = ProgressBar(os.path.getsize(filename), prefix=filename,
+                                   units='bytes')
         # No progress bar, just print the filename being read
         else:
             print("Reading %s" % filename)
@@ -103,52 +315,395 @@ def grep_files(filenames, matches, dateformat='guess', resolution=60,
         # Guess date format?
         if not dateformat or dateformat == 'guess':
             dateformat = dates.guess_file_date_format(filename)
-
-        # HACK: Fake timestamp in case no real timestamps are ever found
-        timestamp = datetime(1970, 1, 1)
-        # What line number are we on?
-        line_num = 0
-        for line in open(filename, 'r'):
-            line_num += 1
-            # Update progress bar every 1000 lines
+        date_chop = dates.DateChopper(dateformat, resolution)
+
+        def lines():
+            # What line number are we on, and how many bytes have been read?
+            line_num = 0
+            position = 0
+            infile = open_file(filename, 'r')
+            for line in infile:
+                line_num += 1
+                position += len(line)
+                # Update progress bar every 10000 lines
+                if show_progress and line_num % 10000 == 0:
+                    # Progress in a compressed file is how much of the
+                    # compressed data has been read
+                    if isinstance(infile, DecompressedFile):
+                        position = infile.tell_compressed()
+                    _show_progress(progress, position, line_num)
+                yield line
             if show_progress:
-                if line_num % 1000 == 0 or line_num == num_lines:
-                    progress.update(line_num)
-                    sys.stdout.write('\r' + str(progress))
-                    sys.stdout.flush()
+                _show_progress(progress, os.path.getsize(filename), line_num)
+
+        def blocks():
+            position = 0
+            for block in _mapped_blocks(filename, 0, size):
+                yield block
+                # Not counting the newline at the start of the block
+                position += block[2] - block[1] - 1
+                if show_progress:
+                    _show_progress(progress, position)
+
+        # HACK: Fake timestamp in case no real timestamps are ever found.
+        # When streaming, lines before the first timestamp in a file are
+        # counted with the last timestamp of the file before it instead, so
+        # timestamps never go back.
+        if timestamp is None or not stream:
+            timestamp = datetime(1970, 1, 1)
+        # Search large blocks of the file at once if possible, or else
+        # one line at a time
+        size = os.path.getsize(filename)
+        stamp_regexp = _scan_regexp(filename, matches, dateformat)
+        if stamp_regexp:
+            for block in blocks():
+                timestamp = _scan_blocks([block], date_chop, stamp_regexp,
+                                         matches, rows, timestamp)
+                yield timestamp
+        else:
+            file_lines = lines()
+            while True:
+                batch = list(islice(file_lines, 10000))
+                if not batch:
+                    break
+                timestamp = _count_matches(batch, date_chop, multi_match,
+                                           rows, timestamp)
+                yield timestamp
+
+        # If using progress bar, print a newline
+        if show_progress:
+            sys.stdout.write('\n')
 
-            # Remove leading/trailing whitespace and newlines
-            line = line.strip()
 
-            # If line is empty, skip it
-            if not line:
-                continue
+def _show_progress(progress, current, lines=None):
+    """Update the `ProgressBar` ``progress`` and redraw it.
+    """
+    progress.update(current, lines)
+    sys.stdout.write('\r' + str(progress))
+    sys.stdout.flush()
 
-            # See if this line has a timestamp
-            try:
-                line_timestamp = dates.date_chop(line, dateformat, resolution)
-            # No timestamp found, stick with the current one
-            except dates.CannotParse:
-                pass
-            # New timestamp found, switch to it
+
+def _count_matches(lines, date_chop, multi_match, rows, timestamp):
+    """Count matches in ``lines`` for `grep_counts`, adding them to ``rows``
+    (a `_Counts`), and return the last timestamp seen. Lines before the
+    first line with a timestamp are counted under the given ``timestamp``.
+    """
+    columns = rows.columns
+    sparse = rows.sparse
+    for line in lines:
+        # Remove leading/trailing whitespace and newlines
+        line = line.strip()
+
+        # If line is empty, skip it
+        if not line:
+            continue
+
+        # See if this line has a timestamp
+        try:
+            line_timestamp = date_chop(line)
+        # No timestamp found, stick with the current one
+        except dates.CannotParse:
+            pass
+        # New timestamp found, switch to it
+        else:
+            timestamp = line_timestamp
+
+        # If this datestamp hasn't appeared before, add it
+        if not sparse and timestamp not in rows:
+            rows.add(timestamp)
+
+        # Count the number of each match in this line
+        for pattern in multi_match.matches(line):
+            rows[timestamp][columns[pattern]] += 1
+
+    return timestamp
+
+
+def _scan_regexp(filename, matches, dateformat):
+    """Return the `dates.timestamp_regexp` for ``dateformat`` if `grep_files`
+    can search ``filename`` for ``matches`` with `_scan_blocks`; otherwise,
+    return ``None``. This needs an uncompressed, non-empty file, and matches
+    that are plain text with no whitespace at either end, since they must
+    match within the line as they would within the stripped line.
+    """
+    if is_compressed(filename) or not os.path.getsize(filename):
+        return None
+    for match in matches:
+        if not match or match != match.strip() or '\n' in match or \
+           _special_chars.search(match):
+            return None
+    return dates.timestamp_regexp(dateformat)
+
+
+def _scan_blocks(blocks, date_chop, stamp_regexp, literals, rows, timestamp):
+    """Count matches for `grep_counts` just like `_count_matches`, but by
+    searching ``blocks`` of whole lines without splitting them into lines.
+    Each block is a ``(data, start, end)`` tuple as from `_mapped_blocks`,
+    where ``data`` is a string or memory map, ``start`` is the offset of the
+    newline before the block's first line, and ``end`` is the offset after
+    its last line; only that range of ``data`` is searched.
+
+    The plain-text ``literals`` are found with ``find``, and only the lines
+    they're found in are looked at, walking back to the timestamp they
+    belong to; lines already walked over aren't looked at again. Timestamp
+    strings are only copied out of ``data`` for those lines, or, unless
+    ``rows`` is sparse, for each line starting with a timestamp, so that
+    every interval gets a row. Each distinct timestamp string in a block is
+    parsed only once.
+    """
+    columns = rows.columns
+    sparse = rows.sparse
+    found_timestamp = False
+    for data, start, end in blocks:
+        # Bucket for each distinct timestamp string, or None if it can't
+        # be parsed
+        buckets = {}
+
+        def bucket(text):
+            if text not in buckets:
+                try:
+                    buckets[text] = date_chop(text)
+                except dates.CannotParse:
+                    buckets[text] = None
+            return buckets[text]
+
+        find, rfind, match = (data.find, data.rfind, stamp_regexp.match)
+
+        # Every interval with a timestamp gets a row, so look at each
+        # timestamp, and remember the last one
+        last = None
+        if not sparse:
+            first = end
+            last_text = None
+            for found in stamp_regexp.finditer(data, start, end):
+                text = found.group(1)
+                # Most lines have the same timestamp as the one before
+                if text == last_text:
+                    continue
+                text_bucket = bucket(text)
+                if text_bucket is not None:
+                    if last is None:
+                        first = found.start()
+                    last, last_text = (text_bucket, text)
+                    if last not in rows:
+                        rows.add(last)
+            # Non-blank lines before the first timestamp count under the
+            # given timestamp
+            if not found_timestamp:
+                if _non_blank.search(data, start, first):
+                    rows.add(timestamp)
+                found_timestamp = last is not None
+
+        # Count each literal once per line it's in
+        for literal in literals:
+            column = columns[literal]
+            # Newline before the last line whose bucket is known, and that
+            # bucket
+            known_newline, known_bucket = (start - 1, timestamp)
+            position = find(literal, start, end)
+            while position >= 0:
+                # Look back for the nearest line with a timestamp, as far
+                # as the last line looked at
+                line_newline = newline = rfind('\n', start, position)
+                while newline > known_newline:
+                    found = match(data, newline, end)
+                    if found:
+                        line_bucket = bucket(found.group(1))
+                        if line_bucket is not None:
+                            known_bucket = line_bucket
+                            break
+                    newline = rfind('\n', start, newline)
+                known_newline = line_newline
+                rows[known_bucket][column] += 1
+                position = find('\n', position, end)
+                if position < 0:
+                    break
+                position = find(literal, position, end)
+
+        # Carry the last timestamp over to the next block, looking back
+        # from the end for it if the timestamps weren't all looked at
+        if sparse:
+            newline = rfind('\n', start, end)
+            while newline >= start:
+                found = match(data, newline, end)
+                if found:
+                    last = bucket(found.group(1))
+                    if last is not None:
+                        break
+                newline = rfind('\n', start, newline)
+        if last is not None:
+            timestamp = last
+
+    return timestamp
+
+# Any non-whitespace character
+_non_blank = re.compile(r'\S')
+
+
+def _mapped_blocks(filename, start, end, block_size=1 << 24):
+    """Yield blocks of ``filename`` from byte offset ``start`` (the start of
+    a line) to ``end`` for `_scan_blocks`, each a ``(data, start, end)``
+    tuple covering about ``block_size`` bytes of whole lines. The file is
+    memory-mapped, and ``data`` is the memory map itself, so nothing is
+    copied out of it; only the first line of the file, which has no newline
+    before it, is copied to a string with one added. The memory map is
+    closed once all the blocks have been searched.
+    """
+    import mmap
+    if start >= end:
+        return
+    infile = open(filename, 'rb')
+    data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if not start:
+            newline = data.find('\n', 0, end)
+            start = end if newline < 0 else newline + 1
+            first_line = '\n' + data[:start]
+            yield (first_line, 0, len(first_line))
+        while start < end:
+            stop = start + block_size
+            if stop < end:
+                newline = data.find('\n', stop - 1, end)
+                stop = end if newline < 0 else newline + 1
             else:
-                timestamp = line_timestamp
+                stop = end
+            yield (data, start - 1, stop)
+            start = stop
+    finally:
+        data.close()
+        infile.close()
 
-            # If this datestamp hasn't appeared before, add it
-            if timestamp not in rows:
-                rows[timestamp] = dict(row_temp)
 
-            # Count the number of each match in this line
-            for expr in compiled_matches:
-                if expr.search(line):
-                    rows[timestamp][expr.pattern] += 1
+def _add_rows(rows, new_rows):
+    """Add the ``{timestamp: counts}`` in ``new_rows`` to ``rows``.
+    """
+    for timestamp, counts in new_rows.iteritems():
+        if timestamp in rows:
+            row = rows[timestamp]
+            for index, count in enumerate(counts):
+                row[index] += count
+        else:
+            rows[timestamp] = counts
 
-        # If using progress bar, print a newline
-        if show_progress:
-            sys.stdout.write('\n')
 
-    # Return a sorted list of (match, {counts}) tuples
-    return sorted(rows.iteritems())
+def _grep_steps_parallel(filenames, matches, dateformat, resolution, jobs,
+                         show_progress, rows, stream=False):
+    """Search the files for `grep_counts` using a pool of ``jobs``
+    processes, adding the counts to ``rows``. Yield the latest timestamp
+    after each chunk of a file. If ``stream`` is true, timestamps carry
+    over from one file to the next.
+    """
+    # Split each file into a few chunks per process, so they all stay busy
+    chunks = []
+    for filename in filenames:
+        # Guess date format?
+        if not dateformat or dateformat == 'guess':
+            dateformat = dates.guess_file_date_format(filename)
+        for start, end in line_chunk_offsets(filename, jobs * 4):
+            chunks.append((filename, start, end, matches, dateformat,
+                           resolution, rows.sparse))
+    print("Reading %d files in %d chunks using %d processes" %
+          (len(filenames), len(chunks), jobs))
+    if show_progress:
+        total = sum(chunk[2] - chunk[1] for chunk in chunks)
+        progress = ProgressBar(total, units='bytes')
+        done = 0
+
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.imap(_grep_chunk, chunks)
+        last_filename = None
+        for chunk in chunks:
+            chunk_rows, last = results.next()
+            filename = chunk[0]
+            # Timestamps only carry over from one file to the next when
+            # streaming, as in _grep_steps
+            if filename != last_filename:
+                if last_filename is None or not stream:
+                    # HACK: Fake timestamp in case no real timestamps are
+                    # ever found
+                    timestamp = datetime(1970, 1, 1)
+                last_filename = filename
+            # Lines before the first timestamp in the chunk belong to the
+            # last timestamp in the chunks before it
+            if None in chunk_rows:
+                _add_rows(rows, {timestamp: chunk_rows.pop(None)})
+            _add_rows(rows, chunk_rows)
+            if last is not None:
+                timestamp = last
+            if show_progress:
+                done += chunk[2] - chunk[1]
+                _show_progress(progress, done)
+            yield timestamp
+    finally:
+        pool.close()
+        pool.join()
+    if show_progress:
+        sys.stdout.write('\n')
+
+
+def line_chunk_offsets(filename, count):
+    """Return a list of ``(start, end)`` byte offsets splitting ``filename``
+    into about ``count`` chunks of whole lines, so each chunk can be read by
+    a different process. A compressed file is one chunk.
+    """
+    size = os.path.getsize(filename)
+    # Compressed files can't be split; they're read whole
+    if is_compressed(filename):
+        return [(0, size)]
+    infile = open(filename, 'r')
+    offsets = [0]
+    for chunk in range(1, count):
+        infile.seek(max(size * chunk // count, offsets[-1]))
+        # Move to the start of the next line
+        infile.readline()
+        offsets.append(infile.tell())
+    infile.close()
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets, offsets[1:])
+            if start < end]
+
+
+def _grep_chunk(args):
+    """Count matches in one chunk of a file for `grep_counts`. Takes a
+    single ``(filename, start, end, matches, dateformat, resolution,
+    sparse)`` tuple so it can be passed to `multiprocessing.Pool.imap`, and
+    returns ``(rows, timestamp)``, where ``rows`` is a `_Counts` and
+    ``timestamp`` is the last one seen. Lines before the first timestamp in
+    the chunk are counted under ``None``, and ``timestamp`` is ``None`` if
+    there are no timestamps in the chunk.
+    """
+    filename, start, end, matches, dateformat, resolution, sparse = args
+    rows = _Counts(_match_columns(matches), sparse)
+    date_chop = dates.DateChopper(dateformat, resolution)
+    stamp_regexp = _scan_regexp(filename, matches, dateformat)
+    if stamp_regexp:
+        timestamp = _scan_blocks(_mapped_blocks(filename, start, end),
+                                 date_chop, stamp_regexp, matches, rows, None)
+        return (rows, timestamp)
+
+    infile = open_file(filename, 'r')
+    infile.seek(start)
+
+    def lines():
+        position = start
+        while position < end:
+            line = infile.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+    # Compressed files are read whole
+    if is_compressed(filename):
+        chunk_lines = infile
+    else:
+        chunk_lines = lines()
+    timestamp = _count_matches(chunk_lines, date_chop, MultiMatch(matches),
+                               rows, None)
+    infile.close()
+    return (rows, timestamp)
 
 
 def top_by(func, count, y_columns, y_values, drop=0):
@@ -172,13 +727,23 @@ def top_by(func, count, y_columns, y_values, drop=0):
             ``count`` top columns
 
     """
-    # List of (func(ys), y_name)
-    results = []
-    for y_name in y_columns:
-        f_ys = func(y_values[y_name])
-        results.append((f_ys, y_name))
+    scores = dict((y_name, func(y_values[y_name])) for y_name in y_columns)
+    return top_by_score(count, y_columns, scores, drop)
+
+
+def top_by_score(count, y_columns, scores, drop=0):
+    """Return the names of the top ``count`` columns in ``y_columns``, by
+    their value in the dictionary ``scores``, after skipping the first
+    ``drop``. Columns with the same score are ordered by name, last first::
+
+        >>> top_by_score(2, ['a', 'b', 'c'], {'a': 5, 'b': 1, 'c': 5})
+        ['c', 'a']
+
+    """
+    # List of (score, y_name)
+    results = [(scores[y_name], y_name) for y_name in y_columns]
     # Keep the top ``count`` after dropping ``drop`` values
-    sorted_columns = [y_name for (f_ys, y_name) in reversed(sorted(results))]
+    sorted_columns = [y_name for (score, y_name) in reversed(sorted(results))]
     return sorted_columns[drop:drop + count]
 
 
@@ -187,6 +752,9 @@ def top_by_average(count, y_columns, y_values, drop=0):
     in ``y_values``, and return the filtered ``y_columns`` names.
     """
     def avg(values):
+        # NumPy arrays can average themselves much faster
+        if hasattr(values, 'mean'):
+            return values.mean()
         return float(sum(values)) / len(values)
     return top_by(avg, count, y_columns, y_values, drop)
 
@@ -195,7 +763,94 @@ def top_by_peak(count, y_columns, y_values, drop=0):
     """Determine the top ``count`` columns based on the peak value
     in ``y_values``, and return the filtered ``y_columns`` names.
     """
-    return top_by(max, count, y_columns, y_values, drop)
+    def peak(values):
+        if hasattr(values, 'max'):
+            return values.max()
+        return max(values)
+    return top_by(peak, count, y_columns, y_values, drop)
+
+
+def column_averages_and_peaks(reader, fieldnames, columns, batch_size=100):
+    """Read all rows from the `csv.reader` ``reader``, and return
+    ``(averages, peaks)``, dictionaries of the average and highest value in
+    each of ``columns``, where ``fieldnames`` names all the columns in the
+    file::
+
+        >>> rows = csv.reader(['1,5', '3,n/a', '', '2,7'])
+        >>> averages, peaks = column_averages_and_peaks(
+        ...     rows, ['a', 'b'], ['b', 'a'])
+        >>> sorted(averages.items()), sorted(peaks.items())
+        ([('a', 2.0), ('b', 4.0)], [('a', 3.0), ('b', 7.0)])
+
+    Values are converted with `float_or_0`, as in `read_xy_values`, so these
+    are what `top_by_average` and `top_by_peak` would rank columns by. Rows
+    are read ``batch_size`` at a time, and only the totals and peaks are
+    kept, so memory use doesn't depend on the size of the file.
+    """
+    totals = [0.0] * len(columns)
+    peaks = [None] * len(columns)
+    count = 0
+    rows = projected_rows(reader, fieldnames, columns)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        count += len(batch)
+        # One tuple of values for each column
+        for index, values in enumerate(zip(*batch)):
+            try:
+                numbers = map(float, values)
+            except ValueError:
+                numbers = map(float_or_0, values)
+            totals[index] += sum(numbers)
+            peak = max(numbers)
+            if peaks[index] is None or peak > peaks[index]:
+                peaks[index] = peak
+
+    averages = dict((column, total / count if count else 0.0)
+                    for column, total in zip(columns, totals))
+    return (averages, dict(zip(columns, peaks)))
+
+
+def downsample(x_values, y_values, max_points):
+    """Return ``(x_values, y_values)`` with at most ``max_points`` points
+    (but at least two), keeping the shape of the line as it would be drawn.
+    The points are split into ``max_points / 2`` runs, and only the lowest
+    and highest point in each run is kept, so peaks are never lost::
+
+        >>> downsample(range(8), [1, 5, 2, 2, 0, 3, 9, 1], 4)
+        ([0, 1, 4, 6], [1, 5, 0, 9])
+
+    Values may be lists or NumPy arrays; with arrays, the result is arrays
+    too. If there are no more than ``max_points`` points, the values are
+    returned as they are.
+    """
+    count = len(y_values)
+    if count <= max_points:
+        return (x_values, y_values)
+    runs = max(max_points // 2, 1)
+    size = -(-count // runs)
+
+    # Lists don't need NumPy, so it isn't imported for them
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(y_values, numpy.ndarray):
+        # One row per run, with the last row padded by repeating the last
+        # value; the first of equal values is chosen, so padding never is
+        rows = numpy.resize(y_values, (-(-count // size), size))
+        rows.flat[count:] = y_values[-1]
+        starts = numpy.arange(0, count, size)
+        indexes = numpy.unique(numpy.concatenate(
+            (starts + rows.argmin(axis=1), starts + rows.argmax(axis=1))))
+        return (x_values[indexes], y_values[indexes])
+
+    indexes = []
+    for start in range(0, count, size):
+        run = range(start, min(start + size, count))
+        low = min(run, key=y_values.__getitem__)
+        high = max(run, key=y_values.__getitem__)
+        indexes.extend(sorted(set([low, high])))
+    return ([x_values[index] for index in indexes],
+            [y_values[index] for index in indexes])
 
 
 def matching_fields(expr, fields):
@@ -275,6 +930,47 @@ def matching_xy_fields(x_expr, y_exprs, fieldnames, verbose=False):
     return (x_column, y_columns)
 
 
+def projected_rows(reader, fieldnames, columns):
+    """Yield a tuple of the values in ``columns`` from each row read by the
+    `csv.reader` ``reader``, where ``fieldnames`` names all the columns in
+    the file (usually, its header row).
+
+    Column positions are found only once, and only the needed fields are
+    kept from each row, so this is much cheaper than `csv.DictReader` when
+    only a few of many columns are needed. As with `csv.DictReader`, blank
+    rows are skipped. Columns missing from ``fieldnames``, or from the end
+    of a short row, are empty::
+
+        >>> rows = csv.reader(['1,2,3', '', '4,5'])
+        >>> list(projected_rows(rows, ['a', 'b', 'c'], ['c', 'a', 'z']))
+        [('3', '1', ''), ('', '4', '')]
+
+    """
+    # Position of each column; duplicate names use the last one, as
+    # csv.DictReader does. Missing columns are in a padding field at the end.
+    positions = dict((name, index) for index, name in enumerate(fieldnames))
+    indexes = [positions.get(column, len(fieldnames)) for column in columns]
+    width = max(indexes) + 1 if indexes else 0
+    fields = _fields_getter(indexes)
+
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        yield fields(row)
+
+
+def _fields_getter(indexes):
+    """Return a function that takes a row and returns a tuple of its fields
+    at the given list of ``indexes``.
+    """
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return operator.itemgetter(*indexes)
+
+
 def read_xy_values(reader, x_column, y_columns,
                    date_format='', gmt_offset=0, zero_time=False):
     """Read values from a `csv.DictReader`, and return ``(x_values,
@@ -304,16 +1000,19 @@ def read_xy_values(reader, x_column, y_columns,
 
     """
     x_values = []
-    y_values = {}
+    y_lists = [[] for y_col in y_columns]
+    parse_date = dates.parse_function(date_format)
 
-    for row in reader:
-        x_value = row[x_column]
+    rows = projected_rows(reader.reader, reader.fieldnames,
+                          [x_column] + y_columns)
+    for row in rows:
+        x_value = row[0]
 
         # If X is supposed to be a date, try to convert it
         try:
             # FIXME: This could do weird things if the x-values
             # are sometimes parseable as dates, and sometimes not
-            x_value = datetime.strptime(x_value, date_format) + \
+            x_value = parse_date(x_value) + \
                 timedelta(hours=gmt_offset)
         # Otherwise, assume it's a floating-point numeric value
         except ValueError:
@@ -322,10 +1021,12 @@ def read_xy_values(reader, x_column, y_columns,
         x_values.append(x_value)
 
         # Append Y values from each column
-        for y_col in y_columns:
-            if y_col not in y_values:
-                y_values[y_col] = []
-            y_values[y_col].append(float_or_0(row[y_col]))
+        for y_list, y_value in zip(y_lists, row[1:]):
+            y_list.append(float_or_0(y_value))
+
+    y_values = {}
+    if x_values:
+        y_values = dict(zip(y_columns, y_lists))
 
     # Adjust datestamps to start at 0:00?
     if date_format and zero_time:
@@ -336,12 +1037,87 @@ def read_xy_values(reader, x_column, y_columns,
     return (x_values, y_values)
 
 
+def read_xy_arrays(reader, x_column, y_columns,
+                   date_format='', gmt_offset=0, zero_time=False):
+    """Read values from a `csv.DictReader` into NumPy arrays, and return
+    ``(x_values, y_values)``, where ``x_values`` is an array of values found
+    in ``x_column``, and ``y_values`` is a dictionary of ``{y_column:
+    array}`` for each column in ``y_columns``. Arguments are the same as
+    for `read_xy_values`.
+
+    Only the selected columns are kept from each row, and whole columns are
+    converted to floating-point at once, so this is much faster than
+    `read_xy_values` for files with many rows or columns. Y values that
+    aren't numeric are ``0``, as with `float_or_0`. With a ``date_format``,
+    ``x_values`` is a ``datetime64`` array, and any X values that can't be
+    parsed are ``NaT`` (not a time). Raise `ImportError` if NumPy 1.13 or
+    later isn't installed.
+    """
+    if import_numpy() is None:
+        raise ImportError("read_xy_arrays requires NumPy 1.13 or later")
+    rows = list(projected_rows(reader.reader, reader.fieldnames,
+                               [x_column] + y_columns))
+    if rows:
+        columns = numpy.array(rows).T
+    else:
+        columns = numpy.empty((len(y_columns) + 1, 0), dtype=str)
+
+    # Convert each Y column, and the X column if it isn't a date
+    if date_format:
+        x_values = _datetime_array(columns[0], date_format)
+        x_values += numpy.timedelta64(gmt_offset, 'h')
+    else:
+        x_values = _float_array(columns[0])
+    y_values = {}
+    for y_col, column in zip(y_columns, columns[1:]):
+        y_values[y_col] = _float_array(column)
+
+    # Adjust datestamps to start at 0:00?
+    if date_format and zero_time:
+        valid = x_values[~numpy.isnat(x_values)]
+        if len(valid):
+            z = valid.min()
+            hms = (z - z.astype('datetime64[D]')).astype('timedelta64[s]')
+            x_values = x_values - hms
+
+    return (x_values, y_values)
+
+
+def _float_array(strings):
+    """Return a float array of the values in the string array ``strings``,
+    converting any that aren't numeric to ``0``.
+    """
+    try:
+        return strings.astype(float)
+    # Some values aren't numeric; convert each one the slow way
+    except ValueError:
+        return numpy.array([float_or_0(value) for value in strings])
+
+
+def _datetime_array(strings, date_format):
+    """Return a ``datetime64`` array of the timestamps in the string array
+    ``strings``, in the given ``date_format``. Timestamps that can't be
+    parsed are ``NaT``.
+    """
+    parse_date = dates.parse_function(date_format)
+    parsed = {}
+    for value in set(strings):
+        try:
+            parsed[value] = parse_date(value)
+        except ValueError:
+            parsed[value] = None
+    return numpy.array([parsed[value] for value in strings],
+                       dtype='datetime64[us]')
+
+
 def line_count(filename):
     """Return the total number of lines in the given file.
     """
     # Not terribly efficient but easy and good enough for now
-    return sum(1 for line in open(filename))
+    return sum(1 for line in open_file(filename))
+
 
+_megabyte = float(1 << 20)
 
 class ProgressBar:
     """An ASCII command-line progress bar with percentage.
@@ -350,7 +1126,8 @@ class ProgressBar:
     http://code.google.com/p/corey-projects/source/browse/trunk/python2/progress_bar.py
     """
     def __init__(self, end, prefix='', fill='=', units='secs', width=40):
-        """Create a progress bar with the given attributes.
+        """Create a progress bar with the given attributes. If ``units`` is
+        ``'bytes'``, amounts are shown in megabytes.
         """
         self.end = end
         self.prog_bar = '[]'
@@ -358,6 +1135,8 @@ class ProgressBar:
         self.fill = fill
         self.units = units
         self.width = width
+        # For working out throughput and time remaining
+        self.start_time = time.time()
         self._update_amount(0)
 
     def _update_amount(self, new_amount):
@@ -372,11 +1151,41 @@ class ProgressBar:
         self.prog_bar = self.prog_bar[0:pct_place] + \
             (pct_string + self.prog_bar[pct_place + len(pct_string):])
 
-    def update(self, current):
-        """Set the current progress.
+    def update(self, current, lines=None):
+        """Set the current progress. Throughput so far and the estimated
+        time remaining are shown too, along with lines per second if the
+        number of ``lines`` processed is given.
+
+            >>> progress = ProgressBar(4 << 20, units='bytes', width=12)
+            >>> progress.start_time -= 2
+            >>> progress.update(1 << 20, lines=5000)
+            >>> print(progress)  # doctest: +ELLIPSIS
+             [===25%    ]  1.0/4.0 MB  0.5 MB/s  2... lines/s  ETA 0:00:06
+
         """
-        self._update_amount((current / float(self.end)) * 100.0)
-        self.prog_bar += '  %d/%d %s' % (current, self.end, self.units)
+        if self.end:
+            self._update_amount((current / float(self.end)) * 100.0)
+        else:
+            self._update_amount(100.0)
+        if self.units == 'bytes':
+            self.prog_bar += '  %.1f/%.1f MB' % (current / _megabyte,
+                                                self.end / _megabyte)
+        else:
+            self.prog_bar += '  %d/%d %s' % (current, self.end, self.units)
+
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0 or current <= 0:
+            return
+        rate = current / elapsed
+        if self.units == 'bytes':
+            self.prog_bar += '  %.1f MB/s' % (rate / _megabyte)
+        else:
+            self.prog_bar += '  %d %s/s' % (rate, self.units)
+        if lines is not None:
+            self.prog_bar += '  %d lines/s' % (lines / elapsed)
+        remaining = int(max(self.end - current, 0) / rate)
+        self.prog_bar += '  ETA %d:%02d:%02d' % (
+            remaining // 3600, remaining // 60 % 60, remaining % 60)
 
     def __str__(self):
         """Return the progress bar as a string.
@@ -398,14 +1207,15 @@ def filter_csv(csv_infile, csv_outfile, columns, match='regexp', action='include
 
     """
     # TODO: Factor out a 'filter_columns' function
-    reader = csv.DictReader(open(csv_infile))
+    reader = csv.reader(open_file(csv_infile))
+    fieldnames = reader.next()
     # Do regular-expression matching of column names?
     if match == 'regexp':
         matching_columns = []
         for expr in columns:
             # TODO: What if more than one expression matches a column?
             # Find a way to avoid duplicates.
-            matching_columns += matching_fields(expr, reader.fieldnames)
+            matching_columns += matching_fields(expr, fieldnames)
     # Exact matching of column names
     else:
         matching_columns = columns
@@ -414,34 +1224,56 @@ def filter_csv(csv_infile, csv_outfile, columns, match='regexp', action='include
     if action == 'include':
         keep_columns = matching_columns
     else:
-        keep_columns = [col for col in reader.fieldnames
+        keep_columns = [col for col in fieldnames
                         if col not in matching_columns]
 
-    # Create writer for the columns we're keeping; ignore any extra columns
-    # passed to the writerow() method.
-    writer = csv.DictWriter(open(csv_outfile, 'w'), keep_columns,
-                            extrasaction='ignore')
-    # Write the header (csv.DictWriter doesn't do this for us)
-    writer.writerow(dict(zip(keep_columns, keep_columns)))
-    for row in reader:
-        writer.writerow(row)
+    # Write only the columns we're keeping
+    writer = csv.writer(open(csv_outfile, 'w'))
+    writer.writerow(keep_columns)
+    writer.writerows(projected_rows(reader, fieldnames, keep_columns))
 
 
-def boring_columns(csvfile):
+def boring_columns(csvfile, sample=0):
     """Return a list of column names in ``csvfile`` that are "boring"--that is,
     the data in them is always the same.
+
+    Reading stops as soon as every column has proven to be interesting. To
+    take a quick look at a huge file, give the number of rows to ``sample``;
+    only that many rows are read, spread evenly through the file, so a
+    column that changes only between them may be called boring. Compressed
+    files are always read in full.
     """
     # TODO: Consider columns that never deviate much (less than 1%, say)
     # to be boring also
-    reader = csv.DictReader(open(csvfile))
-    # Assume all columns are boring until they prove to be interesting
-    boring = list(reader.fieldnames)
+    infile = open_file(csvfile)
+    if sample and not is_compressed(csvfile):
+        fieldnames = csv.reader([infile.readline()]).next()
+        reader = csv.reader(_sampled_lines(infile, sample))
+    else:
+        reader = csv.reader(infile)
+        fieldnames = reader.next()
+    width = len(fieldnames)
+    # Skip blank rows, and pad short ones, as `projected_rows` does
+    rows = (row + [''] * (width - len(row)) for row in reader if row)
+    # Assume all columns are boring until they prove to be interesting;
+    # duplicate names use the last column, as in `projected_rows`
+    positions = dict((name, index) for index, name in enumerate(fieldnames))
+    boring = [positions[name] for name in fieldnames]
     # Remember the first value from each column
-    prev = reader.next()
-    for row in reader:
-        # Check boring columns to see if they have become interesting yet
-        # (make a copy to prevent problems with popping while iterating)
-        for col in list(boring):
+    prev = next(rows, [''] * width)
+    # Values of the boring columns in the previous row
+    fields = _fields_getter(boring) if boring else (lambda row: ())
+    prev_fields = fields(prev)
+    for row in rows:
+        # Rows where no boring column has changed are skipped quickly
+        values = fields(row)
+        if values == prev_fields:
+            continue
+        # Check boring columns that changed to see if they have become
+        # interesting yet
+        changed = compress(boring, map(operator.ne, values, prev_fields))
+        interesting = set()
+        for col in changed:
             # If previous value was empty, set prev to current
             # (this handles the case where a column is empty for a while,
             # then gets a value later). This is not inherently interesting.
@@ -449,10 +1281,33 @@ def boring_columns(csvfile):
                 prev[col] = row[col]
             # If the current value is non-empty, and different from the
             # previous, then it's interesting
-            elif row[col].strip() and row[col] != prev[col]:
-                boring.remove(col)
+            elif row[col].strip():
+                interesting.add(col)
+        if interesting:
+            boring = [col for col in boring if col not in interesting]
+            # Stop reading once every column is interesting
+            if not boring:
+                break
+            fields = _fields_getter(boring)
+        prev_fields = fields(prev)
+    infile.close()
 
     # Return names of all columns that never became interesting
-    return boring
+    return [fieldnames[col] for col in boring]
 
 
+def _sampled_lines(infile, count):
+    """Yield ``count`` whole lines from the open file ``infile``, spread
+    evenly through the rest of the file after the current position.
+    """
+    start = infile.tell()
+    infile.seek(0, 2)
+    end = infile.tell()
+    for index in range(count):
+        infile.seek(start + (end - start) * index // count)
+        # Skip ahead to the start of the next line
+        if index:
+            infile.readline()
+        line = infile.readline()
+        if line:
+            yield line
@@ -0,0 +1,135 @@
+# test_compressed.py
+
+"""Unit tests for the `csvsee.compressed` module.
+"""
+
+import os
+import bz2
+import gzip
+import shutil
+import tempfile
+import unittest
+from csvsee import compressed, grinder, utils
+from csvsee.compressed import open_file
+from . import basic_dir, temp_dir, temp_filename
+
+# Sample data, longer than a small block size
+lines = ['2010/08/30 13:%02d:00 Line %d of the log\n' % (n % 60, n)
+         for n in range(500)]
+data = ''.join(lines)
+
+
+def write_gzip(filename, *chunks):
+    """Write each of the ``chunks`` as a separate gzip stream in
+    ``filename``, like ``cat a.gz b.gz > filename`` would.
+    """
+    outfile = open(filename, 'wb')
+    for chunk in chunks:
+        gzfile = gzip.GzipFile(fileobj=outfile, mode='wb')
+        gzfile.write(chunk)
+        gzfile.close()
+    outfile.close()
+    return filename
+
+
+class TestCompressed (unittest.TestCase):
+    def test_read_gzip(self):
+        filename = write_gzip(temp_filename('log.gz'), data)
+        self.assertEqual(open_file(filename).read(), data)
+        self.assertEqual(list(open_file(filename)), lines)
+
+
+    def test_read_bzip2(self):
+        filename = temp_filename('log.bz2')
+        open(filename, 'wb').write(bz2.compress(data))
+        self.assertEqual(open_file(filename).read(), data)
+        self.assertEqual(list(open_file(filename)), lines)
+
+
+    def test_read_plain(self):
+        filename = temp_filename('log')
+        open(filename, 'w').write(data)
+        infile = open_file(filename)
+        self.assertTrue(isinstance(infile, file))
+        self.assertEqual(list(infile), lines)
+
+
+    def test_multiple_streams(self):
+        # Several gzip streams in one file are read one after another;
+        # a small block size makes streams span several blocks
+        filename = write_gzip(temp_filename('log.gz'),
+                              ''.join(lines[:100]), ''.join(lines[100:]))
+        for block_size in [7, 1 << 20]:
+            infile = open_file(filename)
+            infile.block_size = block_size
+            self.assertEqual(list(infile), lines)
+
+
+    def test_readline_tell_seek(self):
+        filename = write_gzip(temp_filename('log.gz'), data)
+        infile = open_file(filename)
+        infile.block_size = 64
+        self.assertEqual(infile.readline(), lines[0])
+        self.assertEqual(infile.tell(), len(lines[0]))
+        # Seek forward to the start of the fourth line
+        offset = len(''.join(lines[:3]))
+        infile.seek(offset)
+        self.assertEqual(infile.tell(), offset)
+        self.assertEqual(infile.readline(), lines[3])
+        # Seeking backwards isn't possible
+        self.assertRaises(IOError, infile.seek, 0)
+        infile.close()
+
+
+    def test_read_chunks(self):
+        # Reads of any size, and lines, follow on from each other across
+        # blocks
+        filename = write_gzip(temp_filename('log.gz'), data)
+        for size in [1, 10, 333, 1 << 20]:
+            infile = open_file(filename)
+            infile.block_size = 64
+            chunks = [infile.readline()]
+            for chunk in iter(lambda: infile.read(size), ''):
+                chunks.append(chunk)
+                chunks.append(infile.readline())
+            self.assertEqual(''.join(chunks), data)
+            self.assertEqual(infile.tell(), len(data))
+            infile.close()
+
+
+    def test_grep_compressed(self):
+        # Grepping a compressed file gives the same counts as the plain file
+        plain = temp_filename('log')
+        open(plain, 'w').write(data)
+        packed = write_gzip(temp_filename('log.gz'), data)
+        matches = ['Line 1', 'of the']
+        expect = utils.grep_files([plain], matches, show_progress=False)
+        for jobs in [1, 2]:
+            self.assertEqual(
+                utils.grep_files([packed], matches, show_progress=False,
+                                 jobs=jobs),
+                expect)
+
+
+    def test_grinder_compressed(self):
+        # Compressed data* files are found and read like plain ones
+        log_dir = tempfile.mkdtemp(dir=temp_dir)
+        shutil.copy(os.path.join(basic_dir, 'out_XP-0.log'), log_dir)
+        for name in ['data_XP-0.log', 'data_XP-1.log']:
+            plain = open(os.path.join(basic_dir, name)).read()
+            write_gzip(os.path.join(log_dir, name + '.gz'), plain)
+        outfile, datafiles = grinder.grinder_files(log_dir)[0]
+        self.assertEqual([os.path.basename(f) for f in datafiles],
+                         ['data_XP-0.log.gz', 'data_XP-1.log.gz'])
+
+        plain_files = [os.path.join(basic_dir, 'data_XP-%d.log' % n)
+                       for n in range(2)]
+        for packed, plain in zip(datafiles, plain_files):
+            self.assertEqual(sorted(grinder.data_batches(open_file(packed))),
+                             sorted(grinder.data_batches(open(plain))))
+
+
+    def test_is_compressed(self):
+        for ext in compressed.extensions:
+            self.assertTrue(compressed.is_compressed('data' + ext.upper()))
+        self.assertFalse(compressed.is_compressed('data.csv'))
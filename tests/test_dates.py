@@ -4,7 +4,9 @@
 """
 
 import os
+import time
 import unittest
+from datetime import datetime, timedelta
 from csvsee import dates
 from . import write_tempfile
 
@@ -57,3 +59,92 @@ class TestDates (unittest.TestCase):
         os.unlink(filename)
 
 
+
+
+    def test_guess_format_no_date(self):
+        """guess_format raises an exception for strings with no date/time.
+        """
+        for string in ['', 'No digits here', 'Worker 12 of 64', '3.14159']:
+            self.assertRaises(dates.CannotParse, dates.guess_format, string)
+
+
+    def test_parse_function(self):
+        """Functions from `dates.parse_function` give the same results as
+        `datetime.strptime`, including errors.
+        """
+        strings = {
+            '%Y/%m/%d %H:%M:%S': [
+                '2010/08/30 13:57:14', '2010/8/3 1:5:4', '2010/08/30  13:57:14',
+                '2010/13/30 13:57:14', '2010/08/30 13:57:60', '2010/08/30',
+                '2010/08/30 13:57:14 PM', ' 2010/08/30 13:57:14',
+            ],
+            '%m/%d/%y %H:%M:%S.%f': [
+                '08/30/10 13:57:14.123', '08/30/99 13:57:14.000001',
+                '08/30/68 13:57:14.5', '08/30/10 13:57:14.1234567',
+            ],
+            '%m/%d/%Y %I:%M:%S %p': [
+                '08/30/2010 1:57:14 PM', '08/30/2010 13:57:14 PM',
+            ],
+            '%d%m%Y': ['30082010', '3082010'],
+        }
+        for format, values in strings.items():
+            parse = dates.parse_function(format)
+            self.assertTrue(dates.parse_function(format) is parse)
+            for string in values:
+                try:
+                    expected = datetime.strptime(string, format)
+                except ValueError:
+                    self.assertRaises(ValueError, parse, string)
+                else:
+                    self.assertEqual(parse(string), expected)
+
+
+    def test_date_chopper(self):
+        """`dates.DateChopper` rounds timestamps down to the resolution, the
+        same as converting each one with `time.mktime`.
+        """
+        format = '%Y/%m/%d %H:%M:%S'
+        start = datetime(2010, 3, 13, 22, 0, 0)
+        for resolution in [1, 60, 900, 3600, 86400]:
+            chop = dates.DateChopper(format, resolution)
+            for seconds in range(0, 2 * 86400, 317):
+                timestamp = start + timedelta(seconds=seconds)
+                line = timestamp.strftime(format) + ' Some message'
+                epoch = int(time.mktime(timestamp.timetuple()))
+                expected = datetime.fromtimestamp(epoch // resolution * resolution)
+                self.assertEqual(chop(line), expected)
+                # Same result again, from the cache
+                self.assertEqual(chop(line), expected)
+        self.assertRaises(dates.CannotParse, chop, 'No timestamp here')
+        self.assertRaises(dates.CannotParse, chop, 'No timestamp here')
+
+
+    def test_timestamp_regexp(self):
+        """`dates.timestamp_regexp` finds every line a `DateChopper` can
+        parse, and no lines without a timestamp.
+        """
+        lines = [
+            '2010/08/30 13:57:14 Stunned', '  2010/8/3 1:5:4\tPining',
+            '2010/08/30\t13:57:14', '2010/08/30 13:57:14.25 Resting',
+            'Pushing 2010/08/30 13:57:14', '2010/08/30', '',
+        ]
+        format = '%Y/%m/%d %H:%M:%S'
+        chop = dates.DateChopper(format)
+        found = dates.timestamp_regexp(format).findall('\n' + '\n'.join(lines))
+        expected = []
+        for line in lines:
+            try:
+                chop(line)
+            except dates.CannotParse:
+                pass
+            else:
+                expected.append(chop(line))
+        self.assertEqual([chop(text) for text in found], expected)
+        self.assertEqual(len(expected), 3)
+        # Letters match in either case, as with strptime
+        regexp = dates.timestamp_regexp('%Y-%m-%dT%H:%M:%S')
+        self.assertEqual(regexp.findall('\n2010-08-30t13:57:14 Stunned'),
+                         ['2010-08-30t13:57:14'])
+        # Unsupported directives and spacing
+        for format in ['%c', '%H:%M  %S', ' %H:%M:%S', '%H:%M\t%S']:
+            self.assertEqual(dates.timestamp_regexp(format), None)
@@ -5,9 +5,15 @@
 
 import os
 import sys
+import csv
+import json
+import shutil
+import tempfile
 import unittest
+import subprocess
+from datetime import datetime
 from csvsee import graph, utils
-from . import csv_dir, temp_filename
+from . import csv_dir, temp_dir, temp_filename, write_tempfile
 
 class TestGraph (unittest.TestCase):
     @classmethod
@@ -76,6 +82,48 @@ class TestGraph (unittest.TestCase):
         g['x'] = 'Nonexistent column'
         self.assertRaises(utils.NoMatch, g.generate)
 
+    def test_no_data_rows(self):
+        """A .csv file with only a heading row can't be graphed.
+        """
+        csv_file = write_tempfile("Time,CPU,Memory\n")
+        for top in [0, 2]:
+            g = graph.Graph(csv_file, top=top)
+            self.assertRaises(ValueError, g.generate)
+        os.unlink(csv_file)
+
+    def test_read_values_without_datetime64(self):
+        """Dates are read into lists if matplotlib can't plot ``datetime64``
+        arrays.
+        """
+        g = graph.Graph(self.csv_file)
+        plots_datetime64 = graph._plots_datetime64
+        graph._plots_datetime64 = lambda: False
+        try:
+            with open(self.csv_file) as infile:
+                x_values, y_values = g.read_values(
+                    csv.DictReader(infile), 'GMT', ['Request A'])
+        finally:
+            graph._plots_datetime64 = plots_datetime64
+        self.assertEqual(x_values[0], datetime(2010, 8, 30, 19, 10))
+        self.assertEqual(type(y_values['Request A']), list)
+
+    def test_date_range_bad_dates(self):
+        """Dates that can't be parsed are left out of the X axis range.
+        """
+        csv_file = write_tempfile("""Time,CPU
+        bad date,3
+        2010/08/30 13:05:00,2
+        2010/08/30 13:00:00,1
+        2010/08/30 13:10:00,4
+        """)
+        g = graph.Graph(csv_file, dateformat='%Y/%m/%d %H:%M:%S')
+        g.generate()
+        os.unlink(csv_file)
+        self.assertEqual(
+            [graph.mpl.dates.num2date(x).replace(tzinfo=None)
+             for x in g.axes.get_xlim()],
+            [datetime(2010, 8, 30, 13, 0), datetime(2010, 8, 30, 13, 10)])
+
     def test_ylabel_prefix(self):
         """The ylabel = 'prefix' option uses the common column prefix
         as the y-axis label
@@ -85,3 +133,117 @@ class TestGraph (unittest.TestCase):
         g.generate()
         self.assertEqual(g.axes.get_ylabel(), 'Request')
 
+
+
+    def test_lazy_import(self):
+        """Matplotlib and NumPy aren't imported until a graph is drawn, so
+        that other ``csvs`` commands start quickly.
+        """
+        package_dir = os.path.dirname(os.path.dirname(
+            os.path.abspath(graph.__file__)))
+        code = ("import sys, runpy\n"
+                "sys.argv = ['csvs', 'info', %r]\n"
+                "runpy.run_path(%r, run_name='__main__')\n"
+                "import csvsee.graph\n"
+                "print([name in sys.modules\n"
+                "       for name in ('matplotlib', 'numpy')])\n" %
+                (self.csv_file, os.path.join(package_dir, 'csvs')))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=package_dir)
+        self.assertEqual(output.splitlines()[-1], '[False, False]')
+
+
+    def test_graph_maxpoints(self):
+        """Test plotting fewer points for each column with ``maxpoints``.
+        """
+        g = graph.Graph(self.csv_file)
+        g['maxpoints'] = 4
+        g.generate()
+        for line in g.axes.get_lines():
+            self.assertTrue(len(line.get_xdata()) <= 4)
+
+
+    def test_save_graphs(self):
+        """Test saving several graphs from a JSON spec file.
+        """
+        spec_file = temp_filename('json')
+        out_file = temp_filename()
+        spec = {
+            'ymax': 2000,
+            'graphs': [
+                {'title': 'Top', 'top': 2, 'save': out_file + '_top.png'},
+                {'y': 'Request [AB]', 'save': out_file + '_{name}.svg'},
+            ],
+        }
+        json.dump(spec, open(spec_file, 'w'))
+        graphs = graph.read_spec(spec_file, self.csv_file)
+        os.unlink(spec_file)
+
+        filenames = [out_file + '_top.png', out_file + '_response_time.svg']
+        self.assertEqual([filename for g, filename in graphs], filenames)
+        self.assertEqual([g['ymax'] for g, filename in graphs], [2000, 2000])
+        self.assertEqual(graphs[1][0]['y'], ['Request [AB]'])
+
+        graph.save_graphs(graphs)
+        for filename in filenames:
+            self.assertTrue(os.path.isfile(filename))
+            os.unlink(filename)
+        self.assertEqual(graphs[1][0]['dateformat'], graphs[0][0]['dateformat'])
+
+
+    def test_read_spec_errors(self):
+        """Test reading spec files with mistakes in them.
+        """
+        spec_file = temp_filename('json')
+        for spec in ({'graphs': [{'title': 'No filename'}]},
+                     {'graphs': [{'colour': 'red', 'save': 'red.png'}]},
+                     {'graphs': [{'top': 'ten', 'save': 'top.png'}]},
+                     {'graphs': [{'save': '{nmae}.png'}]},
+                     {'graphs': [{'save': '{0}.png'}]},
+                     {'graphs': [{'save': '{name.png'}]},
+                     {'title': 'No graphs'}):
+            json.dump(spec, open(spec_file, 'w'))
+            self.assertRaises(ValueError, graph.read_spec,
+                              spec_file, self.csv_file)
+        open(spec_file, 'w').write('{"graphs": [')
+        self.assertRaises(ValueError, graph.read_spec,
+                          spec_file, self.csv_file)
+        os.unlink(spec_file)
+        self.assertRaises(IOError, graph.read_spec, spec_file, self.csv_file)
+
+
+    def test_render_graphs(self):
+        """Test saving a graph of each .csv file in a process pool.
+        """
+        render_dir = tempfile.mkdtemp(dir=temp_dir)
+        csv_files = [os.path.join(render_dir, name)
+                     for name in ('foo_a.csv', 'foo_b.csv', 'bar.csv')]
+        for csv_file in csv_files:
+            shutil.copy(self.csv_file, csv_file)
+        self.assertEqual(graph.find_csv_files(render_dir), sorted(csv_files))
+        self.assertEqual(graph.find_csv_files(os.path.join(render_dir, 'foo')),
+                         csv_files[:2])
+
+        results = list(graph.render_graphs(
+            csv_files, {'maxpoints': 10}, jobs=2, extension='svg'))
+        self.assertEqual([result[0] for result in results], csv_files)
+        for csv_file, filenames, seconds, error in results:
+            self.assertEqual(error, None)
+            self.assertEqual(filenames, [csv_file[:-3] + 'svg'])
+            self.assertTrue(os.path.isfile(filenames[0]))
+
+        # Errors are reported for each file
+        results = list(graph.render_graphs(csv_files[:1], {'y': ['Nope']}))
+        self.assertEqual(results[0][1], [])
+        self.assertTrue('Nope' in results[0][3])
+
+        # A file with no data rows fails without stopping the others
+        empty_file = os.path.join(render_dir, 'empty.csv')
+        open(empty_file, 'w').write('Time,CPU\n')
+        results = list(graph.render_graphs([empty_file] + csv_files[:1],
+                                           jobs=2, extension='svg'))
+        self.assertEqual([result[1] for result in results],
+                         [[], [csv_files[0][:-3] + 'svg']])
+        self.assertTrue('No data rows' in results[0][3])
+        self.assertEqual(results[1][3], None)
+        shutil.rmtree(render_dir)
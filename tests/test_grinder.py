@@ -6,7 +6,7 @@
 import os
 import unittest
 from csvsee import grinder
-from . import basic_dir, data_dir
+from . import basic_dir, data_dir, write_tempfile
 
 class TestGrinder (unittest.TestCase):
     def test_get_test_names(self):
@@ -43,3 +43,65 @@ class TestGrinder (unittest.TestCase):
         self.assertRaises(ValueError, grinder.grinder_files, 'f00b4r')
 
 
+
+
+    def test_data_batches(self):
+        datafile = write_tempfile(
+            """Thread, Run, Test, Start time (ms since Epoch), Test time, Errors, HTTP response code, HTTP response length
+            0, 0, 1001, 1283195430295, 100, 0, 200, 1000
+            1, 0, 1002, 1283195431295, 200, 1, 503, 2000
+
+            2, 0, 1001, 1283195432295, 300, 0, 200, 3000
+            3, 0, 1001, 12831954
+            """)
+        batches = sorted(grinder.data_batches(open(datafile)))
+        # Values are in the order of Test.all_stats
+        self.assertEqual(batches, [
+            (1001, [1283195430, 1283195432],
+             [(0, 0), (200, 200), [0, 0], (1000, 3000), (100, 300)]),
+            (1002, [1283195431],
+             [(1,), (503,), [1], (2000,), (200,)]),
+        ])
+        os.unlink(datafile)
+
+
+    def test_data_batches_unused_column(self):
+        """Columns that aren't needed may hold anything.
+        """
+        datafile = write_tempfile(
+            """Test, Start time (ms since Epoch), Test time, Errors, HTTP response code, HTTP response length, Custom label
+            1001, 1283195430295, 100, 0, 200, 1000, n/a
+            1001, 1283195432295, 300, 0, 503, 2000, 7
+            """)
+        batches = list(grinder.data_batches(open(datafile)))
+        self.assertEqual(batches, [
+            (1001, [1283195430, 1283195432],
+             [(0, 0), (200, 503), [0, 1], (1000, 2000), (100, 300)]),
+        ])
+        os.unlink(datafile)
+
+
+    def test_data_batches_not_json(self):
+        """Rows that can't be decoded all at once are converted one at a time.
+        """
+        datafile = write_tempfile(
+            """Test, Start time (ms since Epoch), Test time, Errors, HTTP response code, HTTP response length
+            1001, 1283195430295, 100, 0, 200, 1000
+            1001, 1283195432295, 300, 0, 503, 007
+            1001,
+            """)
+        batches = list(grinder.data_batches(open(datafile)))
+        self.assertEqual(batches, [
+            (1001, [1283195430, 1283195432],
+             [(0, 0), (200, 503), [0, 1], (1000, 7), (100, 300)]),
+        ])
+        os.unlink(datafile)
+
+
+    def test_data_batches_bad_header(self):
+        datafile = write_tempfile(
+            """Thread, Run, Test, Test time
+            0, 0, 1001, 100
+            """)
+        self.assertRaises(ValueError, list, grinder.data_batches(open(datafile)))
+        os.unlink(datafile)
@@ -1,7 +1,8 @@
 import os
+import tempfile
 import unittest
 from csvsee import grinder
-from . import basic_dir, data_dir, temp_filename
+from . import basic_dir, data_dir, temp_dir, temp_filename
 
 class TestGrinderReport (unittest.TestCase):
     def setUp(self):
@@ -45,6 +46,28 @@ class TestGrinderReport (unittest.TestCase):
         self.assertEqual(report.timestamp_range(), (1283195400, 1283195820))
 
 
+    def test_parallel_workers(self):
+        """Reading data files in parallel gives the same statistics as
+        reading them serially.
+        """
+        serial = grinder.Report(60, self.outfile, self.data0, self.data1)
+        parallel = grinder.Report(60, self.outfile, self.data0, self.data1,
+                                  workers=2)
+        self.assertEqual(sorted(parallel.tests.keys()),
+                         sorted(serial.tests.keys()))
+        for number, test in serial.tests.items():
+            other = parallel.tests[number]
+            self.assertEqual(other.name, test.name)
+            self.assertEqual(other.timestamp_range(), test.timestamp_range())
+            self.assertEqual(other.counts, test.counts)
+            self.assertEqual(other.sums, test.sums)
+
+
+    def test_unknown_keyword(self):
+        self.assertRaises(TypeError, grinder.Report, 60, self.outfile,
+                          self.data0, jobs=2)
+
+
     def test_add(self):
         pass
 
@@ -136,3 +159,197 @@ class TestGrinderReport (unittest.TestCase):
         for filename in expect_csv_files:
             self.assertTrue(os.path.isfile(filename))
 
+
+
+    def test_write_csvs(self):
+        """Writing several CSVs in one pass gives the same files as writing
+        them one at a time.
+        """
+        report = grinder.Report(60, self.outfile, self.data0, self.data1)
+        stats = ['Errors', 'Test time', 'transactions-page-requests']
+        single_csvs = [temp_filename('csv') for stat in stats]
+        multi_csvs = [temp_filename('csv') for stat in stats]
+        for stat, filename in zip(stats, single_csvs):
+            report.write_csv(stat, filename)
+        report.write_csvs(zip(stats, multi_csvs))
+        for single, multi in zip(single_csvs, multi_csvs):
+            self.assertEqual(open(single).read(), open(multi).read())
+            os.unlink(single)
+            os.unlink(multi)
+
+
+    def test_follow(self):
+        """A report with follow=True reads only new, complete rows each time
+        it's refreshed, and ends up with the same statistics as a report
+        read all at once.
+        """
+        lines = open(self.data0).readlines()
+        datafile = temp_filename('log')
+        follow_file = open(datafile, 'w')
+        # Header, some rows, and an incomplete row
+        follow_file.writelines(lines[:40])
+        follow_file.write(lines[40][:10])
+        follow_file.flush()
+
+        report = grinder.Report(60, self.outfile, datafile, follow=True)
+        self.assertEqual(report.offsets[datafile], len(''.join(lines[:40])))
+        # Nothing new yet
+        self.assertEqual(report.refresh(), 0)
+
+        # Finish the incomplete row, and write the rest
+        follow_file.write(lines[40][10:])
+        follow_file.writelines(lines[41:])
+        follow_file.close()
+        self.assertEqual(report.refresh(), len(''.join(lines[40:])))
+
+        expect = grinder.Report(60, self.outfile, self.data0)
+        for number, test in expect.tests.items():
+            self.assertEqual(report.tests[number].counts, test.counts)
+            self.assertEqual(report.tests[number].sums, test.sums)
+        os.unlink(datafile)
+
+
+    def test_follow_without_test_names(self):
+        """While following, tests with no name logged yet are still counted.
+        """
+        outfile = temp_filename('log')
+        open(outfile, 'w').close()
+        report = grinder.Report(60, outfile, self.data0, follow=True)
+        self.assertEqual(str(report.tests[1001]), '1001: ')
+        self.assertEqual(report.tests[1001].stat_at_time('transactions', 1283195400), 12)
+
+        # Test names show up when the run finishes
+        open(outfile, 'w').write(open(self.outfile).read())
+        self.assertEqual(report.refresh(), 0)
+        self.assertEqual(str(report.tests[1001]), '1001: First test')
+        os.unlink(outfile)
+
+
+    def test_last_line_without_newline(self):
+        """Unless following, a last row with no newline is still read.
+        """
+        datafile = temp_filename('log')
+        open(datafile, 'w').write(open(self.data0).read().rstrip('\n'))
+        report = grinder.Report(60, self.outfile, datafile)
+        expect = grinder.Report(60, self.outfile, self.data0)
+        for number, test in expect.tests.items():
+            self.assertEqual(report.tests[number].counts, test.counts)
+        os.unlink(datafile)
+
+
+    def test_write_csv_no_data(self):
+        """Reports with no statistics have one row of zeros at timestamp 0,
+        unless they're following a live run, when they have only headers.
+        """
+        report_csv = temp_filename('csv')
+        for follow in [False, True]:
+            report = grinder.Report(60, self.outfile, follow=follow)
+            self.assertFalse(report.has_data())
+            self.assertEqual(report.timestamp_range(), (0, 0))
+            report.write_csv('Errors', report_csv)
+            lines = [line.rstrip() for line in open(report_csv)]
+            self.assertTrue(lines[0].startswith('GMT,1000: First page'))
+            if follow:
+                self.assertEqual(len(lines), 1)
+            else:
+                self.assertEqual(len(lines), 2)
+                self.assertEqual(lines[1].split(',')[:3],
+                                 ['01/01/1970 00:00:00.000', '0', '0'])
+        os.unlink(report_csv)
+
+
+    def test_cache(self):
+        """Statistics cached at 1-second granularity give the same results
+        as reading the data files, at any granularity.
+        """
+        cache_dir = os.path.join(tempfile.mkdtemp(dir=temp_dir), 'cache')
+        for granularity in [60, 7, 1, 600]:
+            cached = grinder.Report(granularity, self.outfile, self.data0,
+                                    self.data1, cache_dir=cache_dir)
+            expect = grinder.Report(granularity, self.outfile, self.data0, self.data1)
+            for number, test in expect.tests.items():
+                self.assertEqual(cached.tests[number].granularity, granularity)
+                self.assertEqual(cached.tests[number].counts, test.counts)
+                self.assertEqual(cached.tests[number].sums, test.sums)
+            self.assertEqual(cached.offsets, expect.offsets)
+        # Both data files are cached
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertNotEqual(grinder._load_cache(cache_dir, self.data0), None)
+
+
+    def test_cache_invalidation(self):
+        """Cached statistics are not used after a data file changes.
+        """
+        cache_dir = os.path.join(tempfile.mkdtemp(dir=temp_dir), 'cache')
+        lines = open(self.data0).readlines()
+        datafile = temp_filename('log')
+        open(datafile, 'w').writelines(lines[:40])
+
+        report = grinder.Report(60, self.outfile, datafile, cache_dir=cache_dir)
+        self.assertNotEqual(grinder._load_cache(cache_dir, datafile), None)
+        open(datafile, 'w').writelines(lines)
+        self.assertEqual(grinder._load_cache(cache_dir, datafile), None)
+
+        report = grinder.Report(60, self.outfile, datafile, cache_dir=cache_dir)
+        expect = grinder.Report(60, self.outfile, self.data0)
+        for number, test in expect.tests.items():
+            self.assertEqual(report.tests[number].counts, test.counts)
+            self.assertEqual(report.tests[number].sums, test.sums)
+        os.unlink(datafile)
+
+
+    def test_write_all_csvs_granularities(self):
+        """CSV files at several granularities from a single report are the
+        same as those from reports read at each granularity.
+        """
+        granularities = [7, 1, 600, 60]
+        report = grinder.Report(1, self.outfile, self.data0, self.data1)
+        csv_prefix = temp_filename()
+        report.write_all_csvs(csv_prefix, granularities)
+        for granularity in granularities:
+            expect = grinder.Report(granularity, self.outfile, self.data0, self.data1)
+            expect_prefix = temp_filename()
+            expect.write_all_csvs(expect_prefix)
+            for suffix in ['Errors', 'Test_time', 'Transaction_count',
+                           'Test-time_page_requests_only']:
+                actual = "%s_%ds_%s.csv" % (csv_prefix, granularity, suffix)
+                expected = "%s_%s.csv" % (expect_prefix, suffix)
+                self.assertEqual(open(actual).read(), open(expected).read())
+
+
+    def test_tests_at(self):
+        report = grinder.Report(30, self.outfile, self.data0, self.data1)
+        self.assertTrue(report.tests_at() is report.tests)
+        self.assertTrue(report.tests_at(30) is report.tests)
+        # Rolled-up levels are kept
+        tests_600 = report.tests_at(600)
+        self.assertTrue(report.tests_at(600) is tests_600)
+        self.assertEqual(tests_600[1001].granularity, 600)
+        self.assertEqual(report.timestamp_range(600), (1283195400, 1283195400))
+        # Granularity must be a multiple of the report's
+        self.assertRaises(ValueError, report.tests_at, 45)
+
+
+    def test_percentiles(self):
+        report = grinder.Report(60, self.outfile, self.data0, self.data1,
+                                percentiles=True)
+        # Reading in parallel gives the same percentiles
+        parallel = grinder.Report(60, self.outfile, self.data0, self.data1,
+                                  percentiles=True, workers=2)
+        for number, test in report.tests.items():
+            for stat in ['Test time p50', 'Test time p99',
+                         'Time to first byte max']:
+                stat_at = test.stat_function(stat)
+                parallel_stat_at = parallel.tests[number].stat_function(stat)
+                for timestamp in range(1283195400, 1283195821, 60):
+                    self.assertEqual(stat_at(timestamp),
+                                     parallel_stat_at(timestamp))
+        csv_prefix = temp_filename()
+        report.write_all_csvs(csv_prefix)
+        for suffix in ['Test_time_p50', 'Test_time_p90', 'Test_time_p99',
+                       'Test_time_max', 'Time_to_first_byte_p90',
+                       'Time_to_establish_connection_max']:
+            self.assertTrue(os.path.exists("%s_%s.csv" % (csv_prefix, suffix)))
+        # Percentile files have the same columns as the stat they come from
+        header = open("%s_Test_time_p90.csv" % csv_prefix).readline()
+        self.assertEqual(header, open("%s_Test_time.csv" % csv_prefix).readline())
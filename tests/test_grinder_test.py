@@ -20,7 +20,8 @@ class TestGrinderTest (unittest.TestCase):
         self.assertEqual(test.number, 101)
         self.assertEqual(test.name, 'Foobared')
         self.assertEqual(test.granularity, 30)
-        self.assertEqual(test.bins, {})
+        self.assertEqual(len(test), 0)
+        self.assertEqual(test.start, None)
 
 
     def test_add(self):
@@ -34,16 +35,163 @@ class TestGrinderTest (unittest.TestCase):
                 'Test time': test_time,
             }
         test = grinder.Test(1007, 'Seventh test', 1)
-        self.assertEqual(test.bins, {})
+        self.assertEqual(test.bin_at(15), None)
         test.add(row('15001', '1', '0', '200', '1000', '20'))
         test.add(row('15002', '2', '0', '200', '1000', '30'))
         test.add(row('15003', '3', '1', '200', '1000', '40'))
-        self.assertIn(15, test.bins)
-        self.assertIsInstance(test.bins[15], grinder.Bin)
-        self.assertEqual(test.bins[15].count, 3)
-        self.assertEqual(test.bins[15].stats['Errors'], 6)
-        self.assertEqual(test.bins[15].stats['Test time'], 90)
-        self.assertEqual(test.bins[15].stats['HTTP response length'], 3000)
+        self.assertEqual(test.start, 15)
+        self.assertEqual(len(test), 1)
+        self.assertIsInstance(test.bin_at(15), grinder.Bin)
+        self.assertEqual(test.bin_at(15).count, 3)
+        self.assertEqual(test.bin_at(15).stats['Errors'], 6)
+        self.assertEqual(test.bin_at(15).stats['Test time'], 90)
+        self.assertEqual(test.bin_at(15).stats['HTTP response length'], 3000)
+
+
+    def test_large_sums(self):
+        """Sums beyond a 32-bit integer are kept exactly, and read out as
+        integers, even with arrays of doubles as on Windows.
+        """
+        def row(start_time, length):
+            return {
+                'Start time (ms since Epoch)': start_time,
+                'Errors': '0',
+                'HTTP response code': '200',
+                'HTTP response length': length,
+                'Test time': '10',
+            }
+        typecode = grinder.INT_TYPECODE
+        try:
+            for grinder.INT_TYPECODE in [typecode, 'd']:
+                test = grinder.Test(1009, 'Ninth test', 60)
+                test.add(row('60000', str(2 ** 31)))
+                test.add(row('61000', str(2 ** 31 + 1)))
+                length = test.bin_at(60).stats['HTTP response length']
+                self.assertEqual((length, type(length)), (2 ** 32 + 1, int))
+                average = test.stat_at_time('HTTP response length', 60)
+                self.assertEqual((average, type(average)), (2 ** 31, int))
+                self.assertEqual(test.bin_at(60).count, 2)
+                self.assertEqual(type(test.bin_at(60).count), int)
+        finally:
+            grinder.INT_TYPECODE = typecode
+
+
+    def test_add_out_of_order(self):
+        def row(start_time, test_time):
+            return {
+                'Start time (ms since Epoch)': start_time,
+                'Errors': '0',
+                'HTTP response code': '200',
+                'HTTP response length': '100',
+                'Test time': test_time,
+            }
+        test = grinder.Test(1008, 'Eighth test', 10)
+        test.add(row('50000', '10'))
+        # Earlier row grows the arrays at the front
+        test.add(row('20000', '20'))
+        # Later row grows the arrays at the end
+        test.add(row('75000', '30'))
+        self.assertEqual(len(test), 6)
+        self.assertEqual(test.timestamp_range(), (20, 70))
+        self.assertEqual(test.stat_at_time('Test time', 20), 20)
+        self.assertEqual(test.stat_at_time('Test time', 50), 10)
+        self.assertEqual(test.stat_at_time('Test time', 70), 30)
+        # Intervals between rows have no data
+        self.assertEqual(test.stat_at_time('Test time', 30), 0)
+        self.assertEqual(test.bin_at(30), None)
+        # Timestamps not on an interval boundary have no data
+        self.assertEqual(test.stat_at_time('Test time', 25), 0)
+
+
+    def test_add_batch(self):
+        test = grinder.Test(1006, 'Sixth test', 60)
+        for filename in ['data_XP-0.log', 'data_XP-1.log']:
+            infile = open(os.path.join(basic_dir, filename))
+            for (number, timestamps, values) in grinder.data_batches(infile):
+                if number == 1006:
+                    test.add_batch(timestamps, values)
+        self.assertEqual(test.timestamp_range(), self.test.timestamp_range())
+        self.assertEqual(test.counts, self.test.counts)
+        self.assertEqual(test.sums, self.test.sums)
+
+
+    def test_merge(self):
+        # Split the same rows between two tests, then merge them
+        data0 = os.path.join(basic_dir, 'data_XP-0.log')
+        data1 = os.path.join(basic_dir, 'data_XP-1.log')
+        merged = grinder.Test(1006, 'Sixth test', 60)
+        for filename in [data1, data0]:
+            partial = grinder.Test(1006, None, 60)
+            for row in csv.DictReader(open(filename, 'r'), skipinitialspace=True):
+                if int(row['Test']) == 1006:
+                    partial.add(row)
+            merged.merge(partial)
+        self.assertEqual(merged.timestamp_range(), self.test.timestamp_range())
+        self.assertEqual(merged.counts, self.test.counts)
+        self.assertEqual(merged.sums, self.test.sums)
+        # Merging an empty test changes nothing
+        merged.merge(grinder.Test(1006, None, 60))
+        self.assertEqual(merged.counts, self.test.counts)
+
+
+    def test_merge_granularity_mismatch(self):
+        # Coarser granularity
+        other = grinder.Test(1006, None, 120)
+        self.assertRaises(ValueError, self.test.merge, other)
+        # Finer granularity that doesn't divide evenly
+        other = grinder.Test(1006, None, 45)
+        self.assertRaises(ValueError, self.test.merge, other)
+
+
+    def test_rebin(self):
+        """Re-binning to a coarser granularity gives the same statistics as
+        reading the rows at that granularity.
+        """
+        data0 = os.path.join(basic_dir, 'data_XP-0.log')
+        data1 = os.path.join(basic_dir, 'data_XP-1.log')
+        tests = dict((granularity, grinder.Test(1006, 'Sixth test', granularity))
+                     for granularity in [1, 7, 60, 600])
+        for filename in [data0, data1]:
+            for row in csv.DictReader(open(filename, 'r'), skipinitialspace=True):
+                if int(row['Test']) == 1006:
+                    for test in tests.values():
+                        test.add(row)
+        for granularity in [7, 60, 600]:
+            rebinned = tests[1].rebin(granularity)
+            self.assertEqual(rebinned.granularity, granularity)
+            self.assertEqual(rebinned.timestamp_range(),
+                             tests[granularity].timestamp_range())
+            self.assertEqual(rebinned.counts, tests[granularity].counts)
+            self.assertEqual(rebinned.sums, tests[granularity].sums)
+        # Can't re-bin to a granularity that isn't a multiple
+        self.assertRaises(ValueError, tests[7].rebin, 60)
+
+
+    def test_percentiles(self):
+        data0 = os.path.join(basic_dir, 'data_XP-0.log')
+        data1 = os.path.join(basic_dir, 'data_XP-1.log')
+        test = grinder.Test(1006, 'Sixth test', 60, percentiles=True)
+        test_times = {}
+        for filename in [data0, data1]:
+            for row in csv.DictReader(open(filename, 'r'), skipinitialspace=True):
+                if int(row['Test']) == 1006:
+                    test.add(row)
+                    timestamp = int(row['Start time (ms since Epoch)']) // 60000 * 60
+                    test_times.setdefault(timestamp, []).append(int(row['Test time']))
+        for timestamp, times in test_times.items():
+            times.sort()
+            self.assertEqual(test.stat_at_time('Test time max', timestamp), times[-1])
+            # Estimated within 3%
+            median = times[(len(times) - 1) // 2]
+            p50 = test.stat_at_time('Test time p50', timestamp)
+            self.assertTrue(abs(p50 - median) <= median * 0.03, (p50, median))
+        # Percentiles are kept when re-binned
+        rebinned = test.rebin(600)
+        self.assertEqual(rebinned.stat_at_time('Test time max', 1283195400),
+                         max(max(times) for times in test_times.values()))
+        self.assertEqual(test.stat_at_time('Test time p90', 9999999999), 0)
+        # Percentiles aren't known unless enabled
+        self.assertRaises(ValueError, self.test.stat_function, 'Test time p90')
 
 
     def test_timestamp_range(self):
@@ -88,24 +236,32 @@ class TestGrinderTest (unittest.TestCase):
         self.assertRaises(ValueError, self.test.stat_at_time, 'Fake Stat', 1283195460)
 
 
+    def test_stat_function(self):
+        stat_at = self.test.stat_function('Test time')
+        self.assertEqual(stat_at(1283195460), 2333)
+        self.assertEqual(stat_at(1283195820), 2848)
+        self.assertEqual(stat_at(9999999999), 0)
+        self.assertRaises(ValueError, self.test.stat_function, 'Fake Stat')
+
+
     def test_str(self):
         self.assertEqual(str(self.test), '1006: Sixth test')
 
 
     def test_bin_counts(self):
-        self.assertEqual(self.test.bins[1283195460].count, 12)
-        self.assertEqual(self.test.bins[1283195760].count, 1)
-        self.assertEqual(self.test.bins[1283195820].count, 11)
+        self.assertEqual(self.test.bin_at(1283195460).count, 12)
+        self.assertEqual(self.test.bin_at(1283195760).count, 1)
+        self.assertEqual(self.test.bin_at(1283195820).count, 11)
 
 
     def test_bin_average(self):
         self.assertEqual(
-            self.test.bins[1283195460].average('HTTP response length'), 163)
+            self.test.bin_at(1283195460).average('HTTP response length'), 163)
 
 
     def test_bin_stats(self):
         self.assertEqual(
-            self.test.bins[1283195460].stats,
+            self.test.bin_at(1283195460).stats,
             {
                 '503 Errors': 0,
                 'Errors': 0,
@@ -115,7 +271,7 @@ class TestGrinderTest (unittest.TestCase):
             }
         )
         self.assertEqual(
-            self.test.bins[1283195760].stats,
+            self.test.bin_at(1283195760).stats,
             {
                 '503 Errors': 0,
                 'Errors': 0,
@@ -125,7 +281,7 @@ class TestGrinderTest (unittest.TestCase):
             }
         )
         self.assertEqual(
-            self.test.bins[1283195820].stats,
+            self.test.bin_at(1283195820).stats,
             {
                 '503 Errors': 0,
                 'Errors': 0,
@@ -0,0 +1,127 @@
+# test_stats.py
+
+"""Unit tests for the `csvsee.stats` module.
+"""
+
+import os
+import math
+import random
+import unittest
+from csvsee import stats
+from csvsee.stats import ColumnStats, HyperLogLog, column_stats
+from . import write_tempfile, temp_filename
+
+
+class TestStats (unittest.TestCase):
+    def test_column_stats(self):
+        csv_file = write_tempfile("""Time,CPU,Name,Empty
+        1,5,alpha,
+        2,7.5,beta,
+        3,n/a,alpha,
+        4,,,
+        """)
+        time, cpu, name, empty = column_stats(csv_file)
+        os.unlink(csv_file)
+
+        self.assertEqual(
+            [column.name for column in (time, cpu, name, empty)],
+            ['Time', 'CPU', 'Name', 'Empty'])
+        self.assertEqual([column.rows for column in (time, cpu, name, empty)],
+                         [4, 4, 4, 4])
+        self.assertEqual((time.min, time.max, time.mean), (1.0, 4.0, 2.5))
+        self.assertAlmostEqual(time.stddev, math.sqrt(1.25))
+        self.assertEqual(time.distinct, 4)
+        # 'n/a' is neither a number nor a null
+        self.assertEqual((cpu.nulls, cpu.numbers, cpu.distinct), (1, 2, 3))
+        self.assertEqual((cpu.min, cpu.max, cpu.mean, cpu.stddev),
+                         (5.0, 7.5, 6.25, 1.25))
+        self.assertEqual((name.nulls, name.numbers, name.distinct), (1, 0, 2))
+        self.assertEqual((name.min, name.mean, name.stddev), (None, None, None))
+        self.assertEqual((empty.nulls, empty.distinct), (4, 0))
+
+
+    def test_column_stats_selected_columns(self):
+        csv_file = write_tempfile("""Time,CPU,Memory
+        1,5,100
+        2,7,200
+        """)
+        columns = column_stats(csv_file, columns=['Memory', 'Time'])
+        os.unlink(csv_file)
+        self.assertEqual([column.name for column in columns],
+                         ['Memory', 'Time'])
+        self.assertEqual([column.mean for column in columns], [150.0, 1.5])
+
+
+    def test_column_stats_jobs(self):
+        """Reading in several processes gives the same statistics.
+        """
+        csv_file = temp_filename('csv')
+        outfile = open(csv_file, 'w')
+        outfile.write('Time,Value,Label\n')
+        for row in range(5000):
+            outfile.write('%d,%r,%s\n' % (row, random.gauss(1e6, 10),
+                                          random.choice(['up', 'down', ''])))
+        outfile.close()
+
+        serial = column_stats(csv_file, batch_size=100)
+        parallel = column_stats(csv_file, jobs=2, batch_size=100)
+        os.unlink(csv_file)
+        for one, other in zip(serial, parallel):
+            self.assertEqual((one.rows, one.nulls, one.numbers),
+                             (other.rows, other.nulls, other.numbers))
+            self.assertEqual((one.min, one.max), (other.min, other.max))
+            if one.numbers:
+                self.assertAlmostEqual(one.mean, other.mean)
+                self.assertAlmostEqual(one.stddev, other.stddev)
+            self.assertEqual(one.distinct, other.distinct)
+        # Time has more distinct values than are counted exactly
+        self.assertTrue(4900 < serial[0].distinct < 5100)
+        self.assertEqual(serial[0].mean, 2499.5)
+        self.assertEqual(serial[2].distinct, 2)
+
+
+    def test_column_stats_accuracy(self):
+        """Large values with little variation don't lose precision.
+        """
+        values = [1e9 + n % 7 for n in range(10000)]
+        column = ColumnStats('Value')
+        for start in range(0, len(values), 1000):
+            column.add([repr(value) for value in values[start:start + 1000]])
+        mean = sum(values) / len(values)
+        stddev = math.sqrt(
+            sum((value - mean) ** 2 for value in values) / len(values))
+        self.assertAlmostEqual(column.mean, mean, places=5)
+        self.assertAlmostEqual(column.stddev, stddev)
+
+
+    def test_infinite_values(self):
+        column = ColumnStats('Value')
+        column.add(['1', 'inf', '3', 'nan'])
+        self.assertEqual((column.numbers, column.min, column.max),
+                         (2, 1.0, 3.0))
+        self.assertEqual(column.distinct, 4)
+
+
+    def test_hyperloglog(self):
+        one, other = HyperLogLog(), HyperLogLog()
+        one.update(str(n) for n in range(30000))
+        other.update(str(n) for n in range(20000, 50000))
+        self.assertTrue(29000 < one.estimate() < 31000)
+        one.merge(other)
+        self.assertTrue(48500 < one.estimate() < 51500)
+        self.assertEqual(HyperLogLog().estimate(), 0)
+
+
+    def test_hyperloglog_without_numpy(self):
+        """Registers are the same with or without NumPy.
+        """
+        strings = [str(n) for n in range(5000)]
+        with_numpy = HyperLogLog()
+        with_numpy.update(strings)
+        import_numpy, stats.import_numpy = stats.import_numpy, lambda: None
+        try:
+            without_numpy = HyperLogLog()
+            without_numpy.update(strings)
+        finally:
+            stats.import_numpy = import_numpy
+        self.assertEqual(with_numpy.registers, without_numpy.registers)
@@ -4,10 +4,12 @@
 """
 
 import os
+import re
 import csv
+import time
 import unittest
 from datetime import datetime
-from csvsee import utils
+from csvsee import utils, dates
 from . import write_tempfile, temp_filename
 
 
@@ -61,6 +63,202 @@ class TestUtils (unittest.TestCase):
             os.unlink(filename)
 
 
+    def test_grep_parallel(self):
+        """Grepping in several processes gives the same counts, even when
+        timestamps carry over from one chunk of a file to the next.
+        """
+        filenames = [
+            write_tempfile("""Lines before any timestamp
+                Pining for the fjords
+                2010/08/30 14:04:22 Stunned
+                Pining for the fjords
+                Pining for the fjords
+
+                Pushing up the daisies
+                2010/08/30 14:05:37 Stunned
+                Pushing up the daisies
+                """),
+            write_tempfile("""Pushing up the daisies
+                2010/08/30 14:09:48
+                Pining for the fjords
+                """),
+        ]
+        matches = ['Pushing', 'Pining', 'Stunned']
+        expected = utils.grep_files(filenames, matches, resolution=60,
+                                    show_progress=False)
+        self.assertEqual(expected[0][0], datetime(1970, 1, 1))
+        for jobs in [2, 3]:
+            counts = utils.grep_files(filenames, matches, resolution=60,
+                                      show_progress=False, jobs=jobs)
+            self.assertEqual(counts, expected)
+        for filename in filenames:
+            os.unlink(filename)
+
+
+    def test_grep_counts(self):
+        """`utils.grep_counts` gives counts in the order of the matches, and
+        can leave out empty rows, or stream rows as it goes.
+        """
+        filename = write_tempfile("""2010/08/30 13:57:14 Pushing up the daisies
+            2010/08/30 13:58:08 Stunned
+            2010/08/30 13:59:11 Resting
+            2010/08/30 14:04:22 Pining for the fjords
+            """)
+        matches = ['Pining', 'Stunned', 'Pining']
+        expected = [
+            (datetime(2010, 8, 30, 13, 57), [0, 0, 0]),
+            (datetime(2010, 8, 30, 13, 58), [0, 1, 0]),
+            (datetime(2010, 8, 30, 13, 59), [0, 0, 0]),
+            (datetime(2010, 8, 30, 14, 4), [2, 0, 2]),
+        ]
+        for jobs in [1, 2]:
+            for stream in [False, True]:
+                counts = utils.grep_counts([filename], matches, jobs=jobs,
+                                           show_progress=False, stream=stream)
+                self.assertEqual(list(counts), expected)
+                counts = utils.grep_counts([filename], matches, jobs=jobs,
+                                           show_progress=False, stream=stream,
+                                           sparse=True)
+                self.assertEqual(list(counts), [expected[1], expected[3]])
+        # Streaming fails if timestamps go back to an earlier row
+        counts = utils.grep_counts([filename, filename], matches,
+                                   show_progress=False, stream=True)
+        self.assertRaises(ValueError, list, counts)
+        os.unlink(filename)
+
+
+    def test_grep_counts_stream_files(self):
+        """When streaming, lines before the first timestamp in a file are
+        counted with the last timestamp of the file before it; otherwise,
+        they're counted with the fake 1970 timestamp, as in `grep_files`.
+        """
+        first = write_tempfile("""2010/08/30 13:57:14 Stunned
+            2010/08/30 13:58:08 Resting
+            """)
+        second = write_tempfile("""Stunned, continued from the last file
+            2010/08/30 14:04:22 Pining for the fjords
+            """)
+        matches = ['Pining', 'Stunned']
+        expected = [
+            (datetime(1970, 1, 1), [0, 1]),
+            (datetime(2010, 8, 30, 13, 57), [0, 1]),
+            (datetime(2010, 8, 30, 13, 58), [0, 0]),
+            (datetime(2010, 8, 30, 14, 4), [1, 0]),
+        ]
+        expected_stream = [
+            (datetime(2010, 8, 30, 13, 57), [0, 1]),
+            (datetime(2010, 8, 30, 13, 58), [0, 1]),
+            (datetime(2010, 8, 30, 14, 4), [1, 0]),
+        ]
+        for jobs in [1, 2]:
+            counts = utils.grep_counts([first, second], matches, jobs=jobs,
+                                       show_progress=False)
+            self.assertEqual(list(counts), expected)
+            counts = utils.grep_counts([first, second], matches, jobs=jobs,
+                                       show_progress=False, stream=True)
+            self.assertEqual(list(counts), expected_stream)
+        os.unlink(first)
+        os.unlink(second)
+
+
+    def test_grep_blocks(self):
+        """Searching memory-mapped blocks of a file for plain text gives the
+        same counts as reading one line at a time.
+        """
+        filename = write_tempfile("""Lines before any timestamp
+            Pining for the fjords
+            2010/08/30 14:04:22 Stunned, Stunned
+
+            2010/13/30 14:04:59 Pining for the fjords
+            \t2010/08/30 14:05:37\tPushing up the daisies
+            Stunned
+            2010/08/30 14:05:38.5 Pining for the fjords
+            2010/08/30 14:04:22 Pining for the fjords
+            """)
+        matches = ['Pining', 'Stunned', 'daisies', 'Pining']
+        columns = utils._match_columns(matches)
+        format = '%Y/%m/%d %H:%M:%S'
+        size = os.path.getsize(filename)
+        for timestamp in [datetime(1970, 1, 1), None]:
+            for sparse in [False, True]:
+                expected = utils._Counts(columns, sparse)
+                last = utils._count_matches(
+                    open(filename), dates.DateChopper(format),
+                    utils.MultiMatch(matches), expected, timestamp)
+                # Blocks of one line each, or the whole file
+                for block_size in [1, size]:
+                    blocks = utils._mapped_blocks(filename, 0, size,
+                                                  block_size)
+                    rows = utils._Counts(columns, sparse)
+                    self.assertEqual(
+                        utils._scan_blocks(blocks, dates.DateChopper(format),
+                                           dates.timestamp_regexp(format),
+                                           matches, rows, timestamp),
+                        last)
+                    self.assertEqual(rows, expected)
+        # Counts for 'Pining', 'Stunned', 'daisies'
+        self.assertEqual(list(expected[datetime(2010, 8, 30, 14, 4)]),
+                         [4, 1, 0])
+        os.unlink(filename)
+
+
+    def test_grep_blocks_without_timestamps(self):
+        """Many matching lines without timestamps (like a stack trace) don't
+        each look back over all the lines before them.
+        """
+        filename = write_tempfile(
+            '2010/08/30 14:04:22 Exception\n' +
+            '    at Exception in frame\n' * 20000 +
+            '2010/08/30 14:05:01 Done\n')
+        rows = utils._Counts(utils._match_columns(['Exception']))
+        start = time.time()
+        last = utils._scan_blocks(
+            utils._mapped_blocks(filename, 0, os.path.getsize(filename)),
+            dates.DateChopper('%Y/%m/%d %H:%M:%S'),
+            dates.timestamp_regexp('%Y/%m/%d %H:%M:%S'), ['Exception'],
+            rows, None)
+        os.unlink(filename)
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(last, datetime(2010, 8, 30, 14, 5))
+        self.assertEqual(list(rows[datetime(2010, 8, 30, 14, 4)]), [20001])
+
+
+    def test_line_chunk_offsets(self):
+        """Chunks cover the whole file, and each starts at a new line.
+        """
+        filename = write_tempfile('\n'.join('Line %d' % n for n in range(50)))
+        data = open(filename).read()
+        for count in [1, 3, 7, 100]:
+            offsets = utils.line_chunk_offsets(filename, count)
+            self.assertTrue(len(offsets) <= count)
+            self.assertEqual(offsets[0][0], 0)
+            self.assertEqual(offsets[-1][1], len(data))
+            for (_, end), (next_start, _) in zip(offsets, offsets[1:]):
+                self.assertEqual(end, next_start)
+                self.assertEqual(data[next_start - 1], '\n')
+        os.unlink(filename)
+
+
+    def test_multi_match(self):
+        """`utils.MultiMatch` finds the same patterns as searching for each
+        one separately.
+        """
+        patterns = [
+            'Stunned', 'daisies$', '^2010', '[Pp]ining', 'fjords|parrot',
+            '(?i)PUSHING', r'(\w)\1', '(?P<word>ing)', '(?P<word>ed)',
+            'Stunned', '',
+        ]
+        lines = [
+            '2010/08/30 13:57:14 Pushing up the daisies',
+            'Stunned', 'pining for the fjords', 'Resting', '',
+            'Norwegian Blue parrot', 'Pushing up the daisies, again',
+        ]
+        multi = utils.MultiMatch(patterns)
+        for line in lines:
+            expected = [p for p in patterns if re.search(p, line)]
+            self.assertEqual(sorted(multi.matches(line)), sorted(expected))
+
+
     def test_column_names(self):
         """Test the `utils.column_names` function.
         """
@@ -127,6 +325,56 @@ class TestUtils (unittest.TestCase):
         self.assertEqual(utils.top_by(max, 3, data.keys(), data), ['e', 'd', 'c'])
 
 
+    def test_column_averages_and_peaks(self):
+        """Test the `column_averages_and_peaks` function, which ranks columns
+        the same way as `top_by_average` and `top_by_peak`.
+        """
+        rows = ['%d,%d,%d,%s,%d' % (n, n % 7, 100 - n, 'n/a' if n % 3 else n,
+                                    50)
+                for n in range(100)]
+        fieldnames = ['x', 'a', 'b', 'c', 'd']
+        y_columns = fieldnames[1:]
+        averages, peaks = utils.column_averages_and_peaks(
+            csv.reader(rows), fieldnames, y_columns, batch_size=7)
+        self.assertEqual(averages['b'], 50.5)
+        self.assertEqual(peaks, {'a': 6.0, 'b': 100.0, 'c': 99.0, 'd': 50.0})
+
+        x_values, y_values = utils.read_xy_values(
+            csv.DictReader(['x,a,b,c,d'] + rows), 'x', y_columns)
+        for drop in range(4):
+            self.assertEqual(
+                utils.top_by_score(2, y_columns, averages, drop),
+                utils.top_by_average(2, y_columns, y_values, drop))
+            self.assertEqual(
+                utils.top_by_score(2, y_columns, peaks, drop),
+                utils.top_by_peak(2, y_columns, y_values, drop))
+
+
+    def test_downsample(self):
+        """Test the `downsample` function, with lists and NumPy arrays.
+        """
+        x_values = range(1000)
+        y_values = [float(x % 97) for x in x_values]
+        y_values[500] = 1000.0
+        y_values[501] = -1000.0
+        x_points, y_points = utils.downsample(x_values, y_values, 100)
+        self.assertTrue(len(x_points) <= 100)
+        self.assertEqual(x_points, sorted(x_points))
+        self.assertEqual(y_points, [y_values[x] for x in x_points])
+        # The peaks are kept
+        self.assertTrue(500 in x_points and 501 in x_points)
+
+        numpy = utils.import_numpy()
+        x_array, y_array = utils.downsample(
+            numpy.array(x_values), numpy.array(y_values), 100)
+        self.assertEqual(list(x_array), x_points)
+        self.assertEqual(list(y_array), y_points)
+
+        # Few enough points already
+        self.assertEqual(utils.downsample(x_values, y_values, 1000),
+                         (x_values, y_values))
+
+
     def test_xy_reader_with_timestamps(self):
         """Test the `read_xy_values` function with a ``.csv`` file containing
         timestamps.
@@ -211,6 +459,60 @@ class TestUtils (unittest.TestCase):
         os.unlink(filename)
 
 
+    def test_xy_arrays(self):
+        """Test the `read_xy_arrays` function, which should give the same
+        values as `read_xy_values`.
+        """
+        filename = write_tempfile(
+            """"Eastern Standard Time","Response Time","Response Length"
+               "2010/05/19 13:45:50",419,2048
+               "2010/05/19 13:45:55",315,2048
+               "2010/05/19 13:46:00",,2048
+            """)
+        for kwargs in [{}, {'gmt_offset': 6}, {'zero_time': True}]:
+            args = ('Eastern Standard Time', ['Response Time', 'Response Length'],
+                    '%Y/%m/%d %H:%M:%S')
+            x_values, y_values = utils.read_xy_values(
+                csv.DictReader(open(filename)), *args, **kwargs)
+            x_array, y_arrays = utils.read_xy_arrays(
+                csv.DictReader(open(filename)), *args, **kwargs)
+            self.assertEqual(x_array.dtype.kind, 'M')
+            self.assertEqual(x_array.astype(object).tolist(), x_values)
+            self.assertEqual(sorted(y_arrays.keys()), sorted(y_values.keys()))
+            for y_col, values in y_values.items():
+                self.assertEqual(y_arrays[y_col].tolist(), values)
+        os.unlink(filename)
+
+
+    def test_xy_arrays_bad_values(self):
+        """Test `read_xy_arrays` with unparseable timestamps, non-numeric
+        values and short rows.
+        """
+        filename = write_tempfile(
+            """Time,A,B,C
+               2010/05/19 13:45:50,1,2,3
+               Whenever,4,five,6
+
+               2010/05/19 13:46:00,7
+            """)
+        x_values, y_values = utils.read_xy_arrays(
+            csv.DictReader(open(filename)), 'Time', ['C', 'B'],
+            '%Y/%m/%d %H:%M:%S')
+        self.assertEqual(x_values.astype(object).tolist(), [
+            datetime(2010, 5, 19, 13, 45, 50),
+            None,
+            datetime(2010, 5, 19, 13, 46, 0),
+        ])
+        self.assertEqual(y_values['B'].tolist(), [2.0, 0.0, 0.0])
+        self.assertEqual(y_values['C'].tolist(), [3.0, 6.0, 0.0])
+
+        # Without a date format
+        x_values, y_values = utils.read_xy_arrays(
+            csv.DictReader(open(filename)), 'A', ['C'])
+        self.assertEqual(x_values.tolist(), [1.0, 4.0, 7.0])
+        os.unlink(filename)
+
+
     def test_filter_csv(self):
         """Test the `filter_csv` function.
         """
@@ -262,7 +564,36 @@ class TestUtils (unittest.TestCase):
             """)
         boring = utils.boring_columns(filename)
         self.assertEqual(boring, ['Lame', 'Pointless'])
+        # Sampling every row gives the same result
+        self.assertEqual(utils.boring_columns(filename, sample=10), boring)
+        # Two rows from different parts of the file are enough here
+        self.assertEqual(utils.boring_columns(filename, sample=2),
+                         ['Lame', 'Pointless'])
 
         # Remove the temporary file
         os.unlink(filename)
 
+
+    def test_boring_columns_all_interesting(self):
+        """`boring_columns` handles blank and short rows, and columns that
+        all become interesting.
+        """
+        filename = write_tempfile(
+            """Cool,Lame,Fascinating
+               1,,2
+
+               2,0
+               3,0,6
+               4,0,8
+            """)
+        self.assertEqual(utils.boring_columns(filename), ['Lame'])
+        os.unlink(filename)
+        filename = write_tempfile(
+            """Cool,Fascinating
+               1,2
+               2,4
+               3,6
+            """)
+        self.assertEqual(utils.boring_columns(filename), [])
+        os.unlink(filename)
+